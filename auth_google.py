@@ -1,27 +1,5 @@
-import os
-import pickle
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from google_clients import get_gmail_service, get_sheets_service
 
-SCOPES = [
-    'https://www.googleapis.com/auth/spreadsheets',
-    'https://www.googleapis.com/auth/gmail.readonly'
-]
-
-def get_google_services(credentials_file='gmail_credentials.json', token_file='token.pickle'):
-    creds = None
-    if os.path.exists(token_file):
-        with open(token_file, 'rb') as token:
-            creds = pickle.load(token)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(credentials_file, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(token_file, 'wb') as token:
-            pickle.dump(creds, token)
-    sheets_service = build('sheets', 'v4', credentials=creds)
-    gmail_service = build('gmail', 'v1', credentials=creds)
-    return sheets_service, gmail_service
\ No newline at end of file
+def get_google_services():
+    # Kept for older callers; services now come from the shared client pool
+    return get_sheets_service(), get_gmail_service()
@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# ─────────────────────────────────────────────
+# Benchmark suite
+# ─────────────────────────────────────────────
+# Times start-up (importing the app and drawing the window) and the hot paths against synthetic
+# data (see synthetic_data.py). Each benchmark runs in its own child process inside a scratch
+# directory holding a copy of config.json (dry_run on, master workbook pointed at a generated
+# file), so module-level caches and on-disk state (journal, duplicate index, OTP cache) start
+# cold and the real files are never touched.
+#
+#   python benchmark.py                                  # 1k, 10k and 100k row logs
+#   python benchmark.py --sizes 1000 1000000 --calls 50
+#
+# Every run is appended to benchmark_results.json with the git commit it was taken on, so
+# results from different versions can be compared.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+READPDF_DIR = os.path.join(REPO_DIR, "readpdf")
+RESULTS_PATH = "benchmark_results.json"
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+MASTER_WORKBOOK = "bench_master.xlsx"
+
+
+def summarize(name, samples, **extra):
+    """Timing record for a list of per-call durations in seconds."""
+    ordered = sorted(samples)
+    return {
+        "benchmark": name,
+        **extra,
+        "runs": len(samples),
+        "total_s": round(sum(samples), 6),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+# ─────────────────────────────────────────────
+# Benchmarks (run inside the child process)
+# ─────────────────────────────────────────────
+
+def bench_transaction_log(size, calls):
+    from synthetic_data import transaction_rows, write_transaction_workbook
+
+    results = []
+    elapsed, _ = timed(write_transaction_workbook, MASTER_WORKBOOK, size)
+    results.append(summarize("generate_workbook", [elapsed], size=size))
+
+    # Duplicate check: the first call bootstraps the journal from the workbook and builds the index
+    from duplication_check import is_recent_duplicate_transaction
+
+    recent = list(transaction_rows(calls, seed=1, days=2))
+    elapsed, _ = timed(is_recent_duplicate_transaction, MASTER_WORKBOOK, "MH01AB0001", "", "MV Tax", 100, 100)
+    results.append(summarize("is_recent_duplicate_transaction_cold", [elapsed], size=size))
+    samples = [
+        timed(is_recent_duplicate_transaction, MASTER_WORKBOOK, row[1], row[2], row[4], row[5], row[6])[0]
+        for row in recent
+    ]
+    results.append(summarize("is_recent_duplicate_transaction", samples, size=size))
+
+    from excel_logger import log_otp_to_excel
+
+    samples = []
+    for row in recent:
+        data = {
+            "timestamp": datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S"),
+            "vehicle_reg": row[1], "chassis_number": row[2], "owner_name": row[3],
+            "payment_type": row[4], "rto_amount": row[5], "bank_amount": row[6], "otp": row[7],
+            "employee_name": row[8], "gmail_id": row[9], "raw": row[10],
+        }
+        samples.append(timed(log_otp_to_excel, data, MASTER_WORKBOOK)[0])
+    results.append(summarize("log_otp_to_excel", samples, size=size))
+
+    # Push preparation: the rows push_tab would upload
+    from sync_to_google import read_tab_rows
+    from transaction_journal import HEADERS, JOURNAL_TAB, import_rows
+
+    elapsed, (_, rows) = timed(read_tab_rows, JOURNAL_TAB)
+    results.append(summarize("push_tab_prepare", [elapsed], size=size, rows=len(rows)))
+
+    # Pull preparation: hash the downloaded values and merge them into the journal
+    from downsync_from_google import hash_rows
+
+    sheet_rows = [list(HEADERS)] + [[str(v) for v in row] for row in transaction_rows(size, seed=2)]
+    elapsed, _ = timed(hash_rows, sheet_rows)
+    results.append(summarize("pull_tab_hash", [elapsed], size=size))
+    elapsed, _ = timed(import_rows, sheet_rows[1:])
+    results.append(summarize("pull_tab_import", [elapsed], size=size))
+    return results
+
+
+def bench_match_transactions(size, calls):
+    sys.path.insert(0, READPDF_DIR)
+    from rto_reconciliation import match_transactions, normalize_dates
+    from synthetic_data import reconciliation_frames
+
+    otp_df, summary_df = reconciliation_frames(size)
+    elapsed, _ = timed(lambda: (normalize_dates(otp_df["Transaction Date"]), normalize_dates(summary_df["Transaction Date"])))
+    results = [summarize("normalize_dates", [elapsed], size=size)]
+    otp_df["Norm Date"] = normalize_dates(otp_df["Transaction Date"])
+    summary_df["Norm Date"] = normalize_dates(summary_df["Transaction Date"])
+
+    elapsed, matched = timed(match_transactions, otp_df, summary_df)
+    available = int((matched["Receipt from RTO Portal"] == "Available").sum())
+    results.append(summarize("match_transactions_exact", [elapsed], size=size, matched=available))
+    elapsed, matched = timed(match_transactions, otp_df, summary_df, day_window=1, amount_tolerance=1.0)
+    available = int((matched["Receipt from RTO Portal"] == "Available").sum())
+    results.append(summarize("match_transactions_tolerant", [elapsed], size=size, matched=available))
+    return results
+
+
+def bench_gmail_parsing(size, calls):
+    from gmail_parser import parse_message
+    from synthetic_data import gmail_messages
+
+    messages = gmail_messages(calls)
+    samples = [timed(parse_message, msg_id, payload)[0] for msg_id, payload in messages.items()]
+    return [summarize("parse_message", samples)]
+
+
+def bench_receipt_parsing(size, calls):
+    sys.path.insert(0, READPDF_DIR)
+    from read_rto_receipts import classify_and_parse
+    from synthetic_data import RECEIPT_TEMPLATES, receipt_texts
+
+    # receipt_texts interleaves the schemas, so every len(RECEIPT_TEMPLATES)-th text shares one
+    texts = receipt_texts(calls)
+    results = []
+    for offset, schema_name in enumerate(RECEIPT_TEMPLATES):
+        samples = [
+            timed(classify_and_parse, text, file_name)[0]
+            for file_name, text in texts[offset::len(RECEIPT_TEMPLATES)]
+        ]
+        results.append(summarize("classify_and_parse", samples, schema=schema_name))
+    return results
+
+
+HEAVY_MODULES = ["googleapiclient", "gspread", "google.oauth2", "openpyxl", "pandas"]
+
+
+def bench_startup(size, calls):
+    # Cold start in this fresh process: import the app, then draw the form as main() does
+    started = time.perf_counter()
+    import main
+    import_s = time.perf_counter() - started
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    results = [summarize("startup_import", [import_s], heavy_modules_loaded=loaded)]
+
+    import tkinter
+    import ui_app
+
+    painted = []
+
+    def on_paint():
+        painted.append(time.perf_counter() - started)
+        ui_app.root.destroy()
+
+    try:
+        ui_app.launch_ui(on_paint=on_paint)
+    except tkinter.TclError as e:
+        # No display (e.g. a headless CI box): only the import time is available
+        print(f"⚠️ Skipping first paint: {e}")
+        return results
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    results.append(summarize("startup_first_paint", painted, heavy_modules_loaded=loaded))
+    return results
+
+
+BENCHMARKS = {
+    "startup": (bench_startup, False),
+    "transaction_log": (bench_transaction_log, True),
+    "match_transactions": (bench_match_transactions, True),
+    "gmail_parsing": (bench_gmail_parsing, False),
+    "receipt_parsing": (bench_receipt_parsing, False),
+}
+
+
+# ─────────────────────────────────────────────
+# Driver
+# ─────────────────────────────────────────────
+
+def prepare_workdir(workdir):
+    with open(os.path.join(REPO_DIR, "config.json"), "r") as f:
+        config = json.load(f)
+    config.update(transaction_log_excel_path=MASTER_WORKBOOK, dry_run=True)
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+    shutil.copy(os.path.join(REPO_DIR, "transaction_types.json"), workdir)
+
+
+def run_child(name, size, calls):
+    """Run one benchmark in a fresh process and scratch directory; returns its timing records."""
+    workdir = tempfile.mkdtemp(prefix="otp_bench_")
+    result_path = os.path.join(workdir, "result.json")
+    try:
+        prepare_workdir(workdir)
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")]))}
+        command = [
+            sys.executable, os.path.join(REPO_DIR, "benchmark.py"),
+            "--child", name, "--size", str(size), "--calls", str(calls), "--result-file", result_path,
+        ]
+        subprocess.run(command, cwd=workdir, env=env, check=True)
+        with open(result_path, "r") as f:
+            return json.load(f)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_run(run, output_path):
+    runs = []
+    if os.path.exists(output_path):
+        with open(output_path, "r") as f:
+            runs = json.load(f)
+    runs.append(run)
+    with open(output_path, "w") as f:
+        json.dump(runs, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the OTP utility's hot paths on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="transaction log sizes (rows)")
+    parser.add_argument("--calls", type=int, default=200, help="calls per per-call benchmark")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--output", default=RESULTS_PATH, help="JSON file the run is appended to")
+    parser.add_argument("--child", choices=list(BENCHMARKS), help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        func, _ = BENCHMARKS[args.child]
+        with open(args.result_file, "w") as f:
+            json.dump(func(args.size, args.calls), f)
+        return
+
+    run = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "calls": args.calls,
+        "results": [],
+    }
+    for name in args.only or list(BENCHMARKS):
+        _, sized = BENCHMARKS[name]
+        for size in (args.sizes if sized else [0]):
+            label = f"{name} ({size:,} rows)" if sized else name
+            print(f"⏱️ {label} ...", flush=True)
+            try:
+                records = run_child(name, size, args.calls)
+            except subprocess.CalledProcessError as e:
+                print(f"❌ {label} failed (exit code {e.returncode})")
+                run["results"].append({"benchmark": name, "size": size, "error": f"exit code {e.returncode}"})
+                continue
+            for record in records:
+                print(f"   {record['benchmark']}: mean {record['mean_ms']} ms, p95 {record['p95_ms']} ms ({record['runs']} runs)")
+            run["results"].extend(records)
+
+    save_run(run, args.output)
+    print(f"✅ Results appended to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
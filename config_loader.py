@@ -1,11 +1,17 @@
 import json
 import os
-from logger import setup_logger
+import threading
+from types import MappingProxyType
 
-logger = setup_logger(name="config_loader")
+# config.json is parsed and validated once per process; every module shares the same read-only
+# view (nested objects become mappingproxies, lists become tuples). Restart to pick up edits.
+# logger reads its settings from here, so this module must not log.
 
 CONFIG_PATH = "config.json"
 
+_config = None
+_config_lock = threading.Lock()
+
 REQUIRED_KEYS = {
     "spreadsheet_id": str,
     "tab_mapping": dict,
@@ -19,15 +25,26 @@ def load_transaction_types():
     with open("transaction_types.json", "r") as f:
         return json.load(f)["payment_types"]
 
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
 def load_config():
-    if not os.path.exists(CONFIG_PATH):
-        raise FileNotFoundError("Missing config.json file")
+    global _config
+    with _config_lock:
+        if _config is None:
+            if not os.path.exists(CONFIG_PATH):
+                raise FileNotFoundError("Missing config.json file")
 
-    with open(CONFIG_PATH, "r") as f:
-        config = json.load(f)
+            with open(CONFIG_PATH, "r") as f:
+                config = json.load(f)
 
-    validate_config(config)
-    return config
+            validate_config(config)
+            _config = _freeze(config)
+        return _config
 
 def validate_config(config):
     for key, expected_type in REQUIRED_KEYS.items():
@@ -35,6 +52,3 @@ def validate_config(config):
             raise KeyError(f"Missing required config key: {key}")
         if not isinstance(config[key], expected_type):
             raise TypeError(f"Config key '{key}' must be of type {expected_type.__name__}")
-
-    # Optional: log loaded keys for traceability
-    # logger.info(f"Config loaded successfully with keys: {list(config.keys())}")
@@ -1,20 +1,19 @@
+import hashlib
 import json
+import threading
 from pathlib import Path
-from openpyxl import load_workbook
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from config_loader import load_config
+from google_clients import get_sheets_service
 from logger import setup_logger
+from metrics import span, timed
+from sync_to_google import quote_tab, upload_in_progress
+from transaction_journal import JOURNAL_TAB, bootstrap_from_excel, fill_journal_tab, mark_exported, merge_sheet_rows
+from workbook_cache import edit_workbook, read_tab, replace_sheet, sheet_names
 
 logger = setup_logger(name="sheets_downsync")
 
 # 🔧 Load configuration
-CONFIG_PATH = Path("config.json")
-if not CONFIG_PATH.exists():
-    logger.error(f"❌ config.json not found at: {CONFIG_PATH.resolve()}")
-    raise FileNotFoundError("Missing config.json")
-
-with open(CONFIG_PATH, "r") as f:
-    config = json.load(f)
+config = load_config()
 
 CREDENTIALS_PATH = Path(config["sheets_credentials_path"])
 MASTER_SHEET_PATH = Path(config["transaction_log_excel_path"])
@@ -29,17 +28,16 @@ def refresh_transaction_types(excel_path: Path, tab_name: str, json_path: Path):
         return
 
     try:
-        wb = load_workbook(excel_path)
-        if tab_name not in wb.sheetnames:
+        rows = read_tab(excel_path, tab_name, min_row=2)  # Skip header
+        if rows is None:
             logger.error(f"❌ Tab '{tab_name}' not found in workbook.")
             return
-        ws = wb[tab_name]
     except Exception as e:
         logger.error(f"❌ Failed to load workbook/tab: {e}")
         return
 
     types = []
-    for row in ws.iter_rows(min_row=2, values_only=True):  # Skip header
+    for row in rows:
         if row and row[0]:  # Assuming first column is 'Type'
             types.append(str(row[0]).strip())
 
@@ -56,76 +54,186 @@ def refresh_transaction_types(excel_path: Path, tab_name: str, json_path: Path):
 
 # Function to ensure the Excel file exists and has the required tabs
 def ensure_excel_exists(path: Path, tab_names: list[str]):
-    from openpyxl import Workbook
-
     if not path.exists():
         logger.warning(f"⚠️ Excel file '{path.name}' not found. Creating new workbook...")
-        wb = Workbook()
-        wb.remove(wb.active)
-
-        for tab_name in tab_names:
-            wb.create_sheet(title=tab_name)
-            logger.info(f"🆕 Created tab '{tab_name}' in new workbook.")
+        with edit_workbook(path) as wb:
+            for tab_name in tab_names:
+                wb.create_sheet(title=tab_name)
+                logger.info(f"🆕 Created tab '{tab_name}' in new workbook.")
 
-        wb.save(path)
         logger.info(f"✅ Created new Excel file with tabs: {', '.join(tab_names)}")
 
-# Function to pull data from a Google Sheets tab and write it to an Excel tab
-def pull_tab(sheet_tab, local_tab):
-    
-    if not CREDENTIALS_PATH.exists():
+# Hash of each Sheets tab as of the last pull or push; unchanged tabs are not rewritten
+DOWNSYNC_STATE_PATH = Path("downsync_state.json")
+_state_lock = threading.Lock()  # The uploader and the pull both update the state file
+
+def load_downsync_state():
+    if not DOWNSYNC_STATE_PATH.exists():
+        return {}
+    try:
+        with open(DOWNSYNC_STATE_PATH, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read downsync state, pulling all tabs: {e}")
+        return {}
+
+def save_downsync_state(state):
+    with open(DOWNSYNC_STATE_PATH, "w") as f:
+        json.dump(state, f, indent=2)
+
+def update_downsync_state(digests):
+    """Store the hash of each given Sheets tab (None drops it, so the next pull rewrites that tab)."""
+    with _state_lock:
+        state = load_downsync_state()
+        for sheet_tab, digest in digests.items():
+            if digest is None:
+                state.pop(sheet_tab, None)
+            else:
+                state[sheet_tab] = digest
+        save_downsync_state(state)
+
+def _hash_cell(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return "" if value is None else str(value)
+
+class RowDigest:
+    """
+    Incremental hash of a tab's rows as the Sheets API returns them: cells as text, trailing empty
+    cells and rows left out (the API trims those), so a push and the pull that reads it back agree.
+    """
+
+    def __init__(self):
+        self._sha = hashlib.sha1()
+        self._blank_rows = 0
+
+    def add(self, row):
+        cells = [_hash_cell(value) for value in row]
+        while cells and cells[-1] == "":
+            cells.pop()
+        if not cells:
+            self._blank_rows += 1
+            return
+        line = "[]\n" * self._blank_rows + json.dumps(cells, ensure_ascii=False) + "\n"
+        self._sha.update(line.encode("utf-8"))
+        self._blank_rows = 0
+
+    def hexdigest(self):
+        return self._sha.hexdigest()
+
+def hash_rows(rows):
+    digest = RowDigest()
+    for row in rows:
+        digest.add(row)
+    return digest.hexdigest()
+
+# Function to pull several Google Sheets tabs with one batchGet and write changed ones in one save.
+# Returns False if the tabs could not be read or written.
+def pull_tabs(tab_mapping):
+
+    if not CREDENTIALS_PATH.exists() and not config.get("google_api_endpoint"):
         logger.error(f"❌ Credential file not found: {CREDENTIALS_PATH.resolve()}")
-        return
+        return False
 
     ensure_excel_exists(MASTER_SHEET_PATH, list(TAB_MAPPING.values()))
+    if JOURNAL_TAB in tab_mapping.values():
+        # Capture local history before the tab is overwritten
+        bootstrap_from_excel(MASTER_SHEET_PATH)
 
     try:
-        creds = service_account.Credentials.from_service_account_file(
-            str(CREDENTIALS_PATH),
-            scopes=["https://www.googleapis.com/auth/spreadsheets"]
-        )
-        service = build("sheets", "v4", credentials=creds)
+        service = get_sheets_service()
     except Exception as e:
         logger.error(f"❌ Failed to initialize Google Sheets service: {e}")
-        return
-
+        return False
+
+    # The journal tab is read unformatted (it was pushed RAW; see transaction_journal), other tabs
+    # are mirrored as Sheets displays them. One batchGet per render option.
+    sheet_tabs = list(tab_mapping)
+    groups = {}
+    for sheet_tab in sheet_tabs:
+        render = "UNFORMATTED_VALUE" if tab_mapping[sheet_tab] == JOURNAL_TAB else "FORMATTED_VALUE"
+        groups.setdefault(render, []).append(sheet_tab)
+    fetched = {}
     try:
-        result = service.spreadsheets().values().get(
-            spreadsheetId=SHEET_ID,
-            range=sheet_tab
-        ).execute()
-        rows = result.get("values", [])
+        with span("sheets_pull_fetch"):
+            for render, tabs in groups.items():
+                result = service.spreadsheets().values().batchGet(
+                    spreadsheetId=SHEET_ID,
+                    ranges=[quote_tab(sheet_tab) for sheet_tab in tabs],
+                    valueRenderOption=render,
+                    dateTimeRenderOption="SERIAL_NUMBER"
+                ).execute()
+                # valueRanges come back in request order
+                fetched.update(zip(tabs, result.get("valueRanges", [])))
     except Exception as e:
-        logger.error(f"❌ Failed to fetch data from tab '{sheet_tab}': {e}")
-        return
-
-    if not rows:
-        logger.warning(f"⚠️ No data found in Sheets tab '{sheet_tab}'")
-        return
-
+        logger.error(f"❌ Failed to fetch data from tabs {', '.join(sheet_tabs)}: {e}")
+        return False
+
+    state = load_downsync_state()
+    local_tabs = sheet_names(MASTER_SHEET_PATH)
+    changed = {}
+    for sheet_tab in sheet_tabs:
+        local_tab = tab_mapping[sheet_tab]
+        rows = fetched.get(sheet_tab, {}).get("values", [])
+        if not rows:
+            logger.warning(f"⚠️ No data found in Sheets tab '{sheet_tab}'")
+            continue
+        if local_tab == JOURNAL_TAB and upload_in_progress(sheet_tab):
+            # Rows not re-uploaded yet would read as deleted in Sheets; the push resumes first
+            logger.warning(f"⚠️ Upload to '{sheet_tab}' was interrupted; not merging it until it completes")
+            continue
+        if local_tab == JOURNAL_TAB and len(rows) < 2:
+            # Would read as "every entry was deleted in Sheets"; far more likely a cleared tab
+            logger.warning(f"⚠️ Sheets tab '{sheet_tab}' has no entries; keeping the local journal as is")
+            continue
+
+        digest = hash_rows(rows)
+        if state.get(sheet_tab) == digest and local_tab in local_tabs:
+            logger.info(f"⏭️ '{sheet_tab}' unchanged since last pull; skipping")
+            continue
+        changed[sheet_tab] = (local_tab, rows, digest)
+
+    if not changed:
+        logger.info("✅ Reverse sync: nothing changed in Google Sheets")
+        return True
+
+    # One serialized edit of the shared workbook: rewrite changed tabs, save once
+    exported_seq = None
     try:
-        wb = load_workbook(MASTER_SHEET_PATH)
-        if local_tab not in wb.sheetnames:
-            logger.warning(f"⚠️ Excel tab '{local_tab}' not found in workbook. Creating it...")
-            wb.create_sheet(local_tab)
-        ws = wb[local_tab]
+        with span("sheets_pull_write"), edit_workbook(MASTER_SHEET_PATH) as wb:
+            for sheet_tab, (local_tab, rows, _) in changed.items():
+                if local_tab == JOURNAL_TAB:
+                    # Apply entries added, edited or deleted in Sheets to the local journal, then write
+                    # the merged journal so unsynced local entries stay in the tab
+                    merge_sheet_rows(rows[1:])
+                    exported_seq = fill_journal_tab(wb)
+                else:
+                    ws = replace_sheet(wb, local_tab)
+                    for row in rows:
+                        ws.append(row)
+                logger.info(f"✅ Reverse sync completed for '{local_tab}'. {len(rows)} rows copied.")
     except Exception as e:
-        logger.error(f"❌ Failed to access workbook or tab '{local_tab}': {e}")
-        return
+        logger.error(f"❌ Failed to update workbook '{MASTER_SHEET_PATH}': {e}")
+        return False
 
-    if ws.max_row > 1:
-        ws.delete_rows(1, ws.max_row)
+    if exported_seq is not None:
+        mark_exported(exported_seq)
+    update_downsync_state({sheet_tab: digest for sheet_tab, (_, _, digest) in changed.items()})
+    return True
 
+# Function to pull data from a Google Sheets tab and write it to an Excel tab
+def pull_tab(sheet_tab, local_tab):
+    return pull_tabs({sheet_tab: local_tab})
 
-    for i, row in enumerate(rows, start=1):
-        for j, value in enumerate(row, start=1):
-            ws.cell(row=i, column=j).value = value
-
-    wb.save(MASTER_SHEET_PATH)
-    logger.info(f"✅ Reverse sync completed for '{local_tab}'. {len(rows)} rows copied.")
+# Function to merge the Sheets journal tab into the local journal; run before every push
+def pull_journal_tab():
+    sheet_tab = next((sheet_tab for sheet_tab, local_tab in TAB_MAPPING.items() if local_tab == JOURNAL_TAB), None)
+    if sheet_tab is None:
+        return True
+    return pull_tabs({sheet_tab: JOURNAL_TAB})
 
 # Function to pull all tabs from Google Sheets to local Excel
+@timed("sheets_pull")
 def pull_from_google_sheet():
-    logger.info("🔄 Starting full reverse sync from Google Sheets to local Excel...")
-    for sheet_tab, local_tab in TAB_MAPPING.items():
-        pull_tab(sheet_tab, local_tab)
+    logger.info("🔄 Starting reverse sync from Google Sheets to local Excel...")
+    pull_tabs(TAB_MAPPING)
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from logger import setup_logger
+from transaction_journal import bootstrap_from_excel, iter_rows, last_seq, revision
+
+logger = setup_logger(name="duplicate_index")
+
+INDEX_PATH = Path("duplicate_index.json")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+RETENTION_DAYS = 30  # Buckets older than this are dropped; lookups only look back a few days
+
+# Index layout (in memory and on disk):
+# {
+#   "journal_seq": <last transaction journal sequence the index has seen>,
+#   "journal_revision": <journal edit counter; changes when rows are edited or deleted in place>,
+#   "buckets": { "YYYY-MM-DD": { "<key>": "<latest timestamp>" } }
+# }
+# A key is "V|<vehicle>|<payment>|<rto paise>|<bank paise>" or the same with "C|<chassis>".
+_lock = threading.Lock()
+_index = None
+
+
+def _to_paise(amount):
+    return int(round(float(amount) * 100))
+
+
+def make_keys(vehicle_number, chassis_number, payment_type, rto_amount, bank_amount):
+    """Build the lookup keys for one transaction. Raises ValueError/TypeError on bad amounts."""
+    vehicle_number = str(vehicle_number).strip() if vehicle_number else ""
+    chassis_number = str(chassis_number).strip() if chassis_number else ""
+    payment_type = str(payment_type).strip().lower() if payment_type else ""
+    amounts = f"{payment_type}|{_to_paise(rto_amount)}|{_to_paise(bank_amount)}"
+
+    keys = []
+    if vehicle_number:
+        keys.append(f"V|{vehicle_number}|{amounts}")
+    if chassis_number:
+        keys.append(f"C|{chassis_number}|{amounts}")
+    return keys
+
+
+def _add_row(buckets, row, cutoff):
+    try:
+        logged_time = datetime.strptime(str(row[0]), TIMESTAMP_FORMAT)
+        keys = make_keys(row[1], row[2], row[4], row[5], row[6])
+    except (ValueError, TypeError, IndexError):
+        return
+    if logged_time < cutoff:
+        return
+
+    bucket = buckets.setdefault(logged_time.strftime("%Y-%m-%d"), {})
+    stamp = logged_time.strftime(TIMESTAMP_FORMAT)
+    for key in keys:
+        if stamp > bucket.get(key, ""):
+            bucket[key] = stamp
+
+
+def rebuild_index():
+    """Rebuild the index from the recent part of the transaction journal."""
+    buckets = {}
+    cutoff = datetime.today() - timedelta(days=RETENTION_DAYS)
+    seq = last_seq()
+    edits = revision()
+    for row in iter_rows(since_date=cutoff.strftime(TIMESTAMP_FORMAT)):
+        _add_row(buckets, row, cutoff)
+
+    logger.info(f"🔁 Rebuilt duplicate index from the transaction journal ({len(buckets)} date buckets)")
+    return {"journal_seq": seq, "journal_revision": edits, "buckets": buckets}
+
+
+def _save_index(index):
+    cutoff = (datetime.today() - timedelta(days=RETENTION_DAYS)).strftime("%Y-%m-%d")
+    for day in [d for d in index["buckets"] if d < cutoff]:
+        del index["buckets"][day]
+
+    tmp_path = INDEX_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, INDEX_PATH)
+
+
+def _load_index():
+    if not INDEX_PATH.exists():
+        return None
+    try:
+        with open(INDEX_PATH, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read duplicate index, rebuilding: {e}")
+        return None
+
+
+def _get_index():
+    # Caller must hold _lock
+    global _index
+    if _index is None:
+        _index = _load_index()
+
+    if _index is None or _index.get("journal_seq") != last_seq() or _index.get("journal_revision", 0) != revision():
+        _index = rebuild_index()
+        _save_index(_index)
+    return _index
+
+
+def find_recent(excel_path, keys, days=4):
+    """Return True if any key was logged within the last `days` days."""
+    threshold = datetime.today() - timedelta(days=days)
+    threshold_stamp = threshold.strftime(TIMESTAMP_FORMAT)
+
+    bootstrap_from_excel(excel_path)
+    with _lock:
+        buckets = _get_index()["buckets"]
+        for offset in range(days + 1):
+            bucket = buckets.get((threshold + timedelta(days=offset)).strftime("%Y-%m-%d"))
+            if not bucket:
+                continue
+            for key in keys:
+                stamp = bucket.get(key)
+                if stamp and stamp >= threshold_stamp:
+                    return True
+    return False
+
+
+def record_transaction(row, previous_seq, seq):
+    """
+    Add a row just appended to the journal as `seq`.
+    `previous_seq` is the journal position before the append; if the index had not caught up
+    to it the index is rebuilt instead of patched.
+    """
+    global _index
+    with _lock:
+        if _index is None:
+            _index = _load_index()
+        if _index is None or _index.get("journal_seq") != previous_seq or _index.get("journal_revision", 0) != revision():
+            _index = rebuild_index()
+        else:
+            cutoff = datetime.today() - timedelta(days=RETENTION_DAYS)
+            _add_row(_index["buckets"], row, cutoff)
+            _index["journal_seq"] = seq
+        _save_index(_index)
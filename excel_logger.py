@@ -1,33 +1,16 @@
 import os
-from openpyxl import Workbook, load_workbook
+from duplicate_index import record_transaction
+from metrics import TRANSACTION_LOG_ROWS
+from transaction_journal import (
+    EXPORT_BATCH_SIZE, append_row, bootstrap_from_excel, export_to_excel, last_seq, pending_export_count
+)
 
 def log_otp_to_excel(data, file_path="OTP_transaction_list.xlsx"):
-    headers = [
-        "Transaction Date", "Vehicle Reg. Number","Chassis Number", "Owner Name", "Payment Type",
-        "RTO Amount", "Bank Amount", "OTP", "Employee Name",
-        "Gmail Message ID", "Raw Email Body"
-    ]
-
-    if not os.path.exists(file_path):
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "OTP Logs"
-    else:
-        wb = load_workbook(file_path)
-        ws = wb.active
-
-    # Remove empty first row if present
-    if ws.max_row >= 1 and all(cell.value is None for cell in ws[1]):
-        ws.delete_rows(1)
-
-    # Write headers to row 1 if missing
-    if ws.max_row == 0 or [cell.value for cell in ws[1]] != headers:
-        for col_num, header in enumerate(headers, start=1):
-            ws.cell(row=1, column=col_num, value=header)
+    # The SQLite journal is the write path; the xlsx tab is re-exported from it in batches.
+    # Raises transaction_journal.DuplicateEntryError if the OTP email already backs another entry.
+    bootstrap_from_excel(file_path)
 
-    # Append data to next available row
-    next_row = ws.max_row + 1
-    ws.append([
+    row = [
         data["timestamp"].strftime("%Y-%m-%d %H:%M:%S") if data["timestamp"] else "",
         data.get("vehicle_reg",""),
         data.get("chassis_number", ""),
@@ -39,7 +22,21 @@ def log_otp_to_excel(data, file_path="OTP_transaction_list.xlsx"):
         data["employee_name"],
         data.get("gmail_id", ""),
         data.get("raw", "")
-    ])
+    ]
+
+    previous_seq = last_seq()
+    seq = append_row(row)
+    if seq is None:
+        return
+
+    # Keep the duplicate index in step with the journal
+    record_transaction(row, previous_seq, seq)
+    TRANSACTION_LOG_ROWS.set(seq)
 
-    wb.save(file_path)
+    if pending_export_count() >= EXPORT_BATCH_SIZE or not os.path.exists(file_path):
+        export_to_excel(file_path)
 
+def export_transaction_log(file_path="OTP_transaction_list.xlsx"):
+    # On-demand refresh of the xlsx Transaction_Log tab
+    if pending_export_count():
+        export_to_excel(file_path)
@@ -0,0 +1,409 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from synthetic_data import gmail_message
+
+# ─────────────────────────────────────────────
+# Local stand-ins for the Gmail and Sheets APIs
+# ─────────────────────────────────────────────
+# Serves the slice of the REST APIs this utility calls (googleapiclient and gspread alike), from
+# memory. Point the app at it with "google_api_endpoint": "http://127.0.0.1:<port>" in config.json;
+# google_clients then talks to this server with anonymous credentials instead of Google.
+#
+# Each API gets fault settings under config["fake_google"]["gmail" | "sheets"]:
+#   latency_ms, jitter_ms  - added to every HTTP call
+#   error_rate             - share of calls (or batch parts) answered with 503
+#   quota_per_minute       - calls beyond this in a sliding minute get 429 RESOURCE_EXHAUSTED
+#
+#   python fake_google.py --port 8765      # standalone; POST /fake/emails {"amount": 1234.5} adds an OTP mail
+
+DEFAULT_FAULTS = {"latency_ms": 0, "jitter_ms": 0, "error_rate": 0.0, "quota_per_minute": 0}
+
+
+class FaultInjector:
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, quota_per_minute=0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.quota_per_minute = quota_per_minute
+        self._rng = random.Random(seed)
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    def fault(self):
+        """(status, message) for a call that should fail, or None. Each call counts toward the quota."""
+        now = time.monotonic()
+        with self._lock:
+            if self.quota_per_minute:
+                while self._calls and now - self._calls[0] > 60:
+                    self._calls.popleft()
+                if len(self._calls) >= self.quota_per_minute:
+                    return 429, "RESOURCE_EXHAUSTED", "Quota exceeded for quota metric 'Requests per minute'"
+                self._calls.append(now)
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return 503, "UNAVAILABLE", "The service is currently unavailable."
+        return None
+
+
+def _error_body(code, status, message):
+    return {"error": {"code": code, "status": status, "message": message}}
+
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index
+
+
+A1_RANGE = re.compile(r"^(?:'((?:[^']|'')+)'|([^!]+?))(?:!([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?)?$")
+
+
+def parse_range(a1):
+    """(tab title, first row, first column, last row or None), rows and columns 1-based."""
+    match = A1_RANGE.match(a1)
+    if not match:
+        raise ValueError(f"Unable to parse range: {a1}")
+    quoted, bare, start_col, start_row, _, end_row = match.groups()
+    title = quoted.replace("''", "'") if quoted is not None else bare
+    return (
+        title,
+        int(start_row) if start_row else 1,
+        _column_index(start_col) if start_col else 1,
+        int(end_row) if end_row else None,
+    )
+
+
+class FakeGoogle:
+    """In-memory mailbox and spreadsheets behind the fake API server."""
+
+    def __init__(self, faults=None, seed=None):
+        faults = faults or {}
+        self.gmail_faults = FaultInjector(**{**DEFAULT_FAULTS, **faults.get("gmail", {})}, seed=seed)
+        self.sheets_faults = FaultInjector(**{**DEFAULT_FAULTS, **faults.get("sheets", {})}, seed=seed)
+        self.lock = threading.Lock()
+        self.history_id = 1000
+        self.messages = []       # (history id, message), oldest first
+        self.by_id = {}
+        self.spreadsheets = {}   # id -> {title: {"sheetId", "index", "rows", "cols", "values"}}
+        self._rng = random.Random(seed)
+
+    # ── Gmail ──
+    def add_otp_email(self, amount, otp=None):
+        """Deliver an OTP email for `amount`; returns (message id, otp)."""
+        otp = otp or f"{self._rng.randint(0, 999999):06d}"
+        with self.lock:
+            self.history_id += 1
+            msg_id = f"{self.history_id:016x}"
+            message = gmail_message(msg_id, amount, otp, datetime.now().astimezone())
+            self.messages.append((self.history_id, message))
+            self.by_id[msg_id] = message
+        return msg_id, otp
+
+    def list_messages(self, max_results):
+        with self.lock:
+            newest = [m for _, m in reversed(self.messages[-max_results:])] if max_results else []
+        return {"messages": [{"id": m["id"], "threadId": m["id"]} for m in newest], "resultSizeEstimate": len(newest)}
+
+    def history_since(self, start_history_id):
+        with self.lock:
+            added = [(h, m) for h, m in self.messages if h > start_history_id]
+            current = self.history_id
+        response = {"historyId": str(current)}
+        if added:
+            response["history"] = [
+                {"id": str(h), "messagesAdded": [{"message": {"id": m["id"], "threadId": m["id"]}}]} for h, m in added
+            ]
+        return response
+
+    # ── Sheets ──
+    def spreadsheet(self, spreadsheet_id):
+        with self.lock:
+            return self.spreadsheets.setdefault(
+                spreadsheet_id, {"Sheet1": {"sheetId": 0, "index": 0, "rows": 1000, "cols": 26, "values": []}}
+            )
+
+    def add_tab(self, spreadsheet_id, title, rows=1000, cols=26):
+        tabs = self.spreadsheet(spreadsheet_id)
+        with self.lock:
+            if title not in tabs:
+                tabs[title] = {
+                    "sheetId": max(t["sheetId"] for t in tabs.values()) + 1 if tabs else 0,
+                    "index": len(tabs), "rows": rows, "cols": cols, "values": [],
+                }
+            return tabs[title]
+
+    def metadata(self, spreadsheet_id):
+        tabs = self.spreadsheet(spreadsheet_id)
+        with self.lock:
+            sheets = [
+                {"properties": {
+                    "sheetId": t["sheetId"], "title": title, "index": t["index"], "sheetType": "GRID",
+                    "gridProperties": {"rowCount": t["rows"], "columnCount": t["cols"]},
+                }}
+                for title, t in sorted(tabs.items(), key=lambda item: item[1]["index"])
+            ]
+        return {
+            "spreadsheetId": spreadsheet_id,
+            "properties": {"title": "Daily_Transactions_Log_OTP_based", "locale": "en_US", "timeZone": "Asia/Kolkata"},
+            "sheets": sheets,
+        }
+
+    def _tab_for(self, spreadsheet_id, a1):
+        title, start_row, start_col, end_row = parse_range(a1)
+        tab = self.spreadsheet(spreadsheet_id).get(title)
+        if tab is None:
+            raise ValueError(f"Unable to parse range: {a1}")
+        return tab, start_row, start_col, end_row
+
+    def get_values(self, spreadsheet_id, a1):
+        tab, start_row, start_col, end_row = self._tab_for(spreadsheet_id, a1)
+        with self.lock:
+            rows = tab["values"][start_row - 1:end_row]
+            rows = [row[start_col - 1:] for row in rows]
+            while rows and not any(rows[-1]):
+                rows.pop()
+        response = {"range": a1, "majorDimension": "ROWS"}
+        if rows:
+            response["values"] = [list(row) for row in rows]
+        return response
+
+    def clear_values(self, spreadsheet_id, a1):
+        tab, start_row, _, end_row = self._tab_for(spreadsheet_id, a1)
+        with self.lock:
+            if start_row == 1 and end_row is None:
+                tab["values"] = []
+            else:
+                for i in range(start_row - 1, min(end_row or len(tab["values"]), len(tab["values"]))):
+                    tab["values"][i] = []
+        return {"spreadsheetId": spreadsheet_id, "clearedRange": a1}
+
+    def update_values(self, spreadsheet_id, a1, values):
+        tab, start_row, start_col, _ = self._tab_for(spreadsheet_id, a1)
+        with self.lock:
+            grid = tab["values"]
+            for offset, row in enumerate(values):
+                index = start_row - 1 + offset
+                while len(grid) <= index:
+                    grid.append([])
+                current = grid[index] + [""] * max(0, start_col - 1 - len(grid[index]))
+                grid[index] = current[:start_col - 1] + [str(v) for v in row] + current[start_col - 1 + len(row):]
+        return {"spreadsheetId": spreadsheet_id, "updatedRange": a1, "updatedRows": len(values)}
+
+    def batch_update(self, spreadsheet_id, requests):
+        replies = []
+        for request in requests:
+            if "addSheet" in request:
+                props = request["addSheet"].get("properties", {})
+                grid = props.get("gridProperties", {})
+                tab = self.add_tab(spreadsheet_id, props["title"], grid.get("rowCount", 1000), grid.get("columnCount", 26))
+                replies.append({"addSheet": {"properties": {
+                    "sheetId": tab["sheetId"], "title": props["title"], "index": tab["index"], "sheetType": "GRID",
+                    "gridProperties": {"rowCount": tab["rows"], "columnCount": tab["cols"]},
+                }}})
+            elif "updateSheetProperties" in request:
+                props = request["updateSheetProperties"]["properties"]
+                with self.lock:
+                    for tab in self.spreadsheet(spreadsheet_id).values():
+                        if tab["sheetId"] == props.get("sheetId"):
+                            grid = props.get("gridProperties", {})
+                            tab["rows"] = grid.get("rowCount", tab["rows"])
+                            tab["cols"] = grid.get("columnCount", tab["cols"])
+                replies.append({})
+            elif "appendDimension" in request:
+                append = request["appendDimension"]
+                with self.lock:
+                    for tab in self.spreadsheet(spreadsheet_id).values():
+                        if tab["sheetId"] == append.get("sheetId"):
+                            key = "rows" if append.get("dimension") == "ROWS" else "cols"
+                            tab[key] += append.get("length", 0)
+                replies.append({})
+            else:
+                replies.append({})
+        return {"spreadsheetId": spreadsheet_id, "replies": replies}
+
+
+# ─────────────────────────────────────────────
+# HTTP layer
+# ─────────────────────────────────────────────
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake = None  # set per server class
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        body = self._body()
+        if url.path in ("/batch", "/batch/gmail/v1"):
+            self.fake.gmail_faults.delay()
+            return self._send_batch(body)
+
+        api = "gmail" if url.path.startswith("/gmail/") else "sheets"
+        faults = self.fake.gmail_faults if api == "gmail" else self.fake.sheets_faults
+        faults.delay()
+        status, response = self._fault_or_route(faults, method, url.path, parse_qs(url.query), body)
+        self._send(status, response)
+
+    def _fault_or_route(self, faults, method, path, query, body):
+        fault = faults.fault()
+        if fault:
+            code, status, message = fault
+            return code, _error_body(code, status, message)
+        try:
+            return route(self.fake, method, unquote(path), query, json.loads(body) if body else {})
+        except ValueError as e:
+            return 400, _error_body(400, "INVALID_ARGUMENT", str(e))
+
+    def _send_batch(self, body):
+        # multipart/mixed of application/http parts, answered part by part in the same order
+        message = BytesParser().parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + body
+        )
+        boundary = "batch_fake_google"
+        chunks = []
+        for part in message.get_payload():
+            request_text = part.get_payload(decode=False)
+            request_line, _, rest = request_text.partition("\n")
+            method, target, _ = request_line.strip().split(" ", 2)
+            url = urlsplit(target)
+            headers_text, _, part_body = rest.partition("\r\n\r\n") if "\r\n\r\n" in rest else rest.partition("\n\n")
+            status, response = self._fault_or_route(
+                self.fake.gmail_faults, method, url.path, parse_qs(url.query),
+                part_body.strip().encode("utf-8")
+            )
+            content_id = part["Content-ID"].strip("<>")
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n\r\n"
+                f"{json.dumps(response)}\r\n"
+            )
+        payload = ("".join(chunks) + f"--{boundary}--\r\n").encode("utf-8")
+        self._send(200, payload, content_type=f"multipart/mixed; boundary={boundary}")
+
+
+GMAIL_MESSAGE = re.compile(r"^/gmail/v1/users/[^/]+/messages/([^/]+)$")
+SPREADSHEET = re.compile(r"^/v4/spreadsheets/([^/:]+)(.*)$")
+
+
+def route(fake, method, path, query, body):
+    """(status, JSON body) for one API call."""
+    if path.startswith("/fake/emails") and method == "POST":
+        msg_id, otp = fake.add_otp_email(float(body["amount"]), body.get("otp"))
+        return 200, {"id": msg_id, "otp": otp}
+
+    if path.startswith("/gmail/v1/users/"):
+        if path.endswith("/profile"):
+            with fake.lock:
+                return 200, {"emailAddress": "fake@example.com", "historyId": str(fake.history_id)}
+        if path.endswith("/messages"):
+            return 200, fake.list_messages(int(query.get("maxResults", ["100"])[0]))
+        if path.endswith("/history"):
+            return 200, fake.history_since(int(query.get("startHistoryId", ["0"])[0]))
+        match = GMAIL_MESSAGE.match(path)
+        if match:
+            message = fake.by_id.get(match.group(1))
+            if message is None:
+                return 404, _error_body(404, "NOT_FOUND", "Requested entity was not found.")
+            return 200, message
+
+    match = SPREADSHEET.match(path)
+    if match:
+        spreadsheet_id, rest = match.groups()
+        if rest == "" and method == "GET":
+            return 200, fake.metadata(spreadsheet_id)
+        if rest == ":batchUpdate":
+            return 200, fake.batch_update(spreadsheet_id, body.get("requests", []))
+        if rest == "/values:batchGet":
+            return 200, {"spreadsheetId": spreadsheet_id,
+                         "valueRanges": [fake.get_values(spreadsheet_id, r) for r in query.get("ranges", [])]}
+        if rest == "/values:batchClear":
+            for a1 in body.get("ranges", []):
+                fake.clear_values(spreadsheet_id, a1)
+            return 200, {"spreadsheetId": spreadsheet_id, "clearedRanges": body.get("ranges", [])}
+        if rest == "/values:batchUpdate":
+            for value_range in body.get("data", []):
+                fake.update_values(spreadsheet_id, value_range["range"], value_range.get("values", []))
+            return 200, {"spreadsheetId": spreadsheet_id, "totalUpdatedRows": sum(len(d.get("values", [])) for d in body.get("data", []))}
+        if rest.startswith("/values/"):
+            a1 = rest[len("/values/"):]
+            if a1.endswith(":clear"):
+                return 200, fake.clear_values(spreadsheet_id, a1[:-len(":clear")])
+            if method == "PUT":
+                return 200, fake.update_values(spreadsheet_id, a1, body.get("values", []))
+            if method == "GET":
+                return 200, fake.get_values(spreadsheet_id, a1)
+
+    return 404, _error_body(404, "NOT_FOUND", f"No fake handler for {method} {path}")
+
+
+def start_server(fake=None, host="127.0.0.1", port=0):
+    """Serve `fake` on a background thread. Returns (server, base URL); port 0 picks a free port."""
+    fake = fake or FakeGoogle()
+    handler = type("FakeGoogleHandler", (_Handler,), {"fake": fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-google", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake Gmail and Sheets APIs locally.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", default="config.json", help="reads fault settings from its 'fake_google' key")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    fake = FakeGoogle(faults=config.get("fake_google", {}))
+    for tab in config.get("tab_mapping", {}).values():
+        fake.add_tab(config["spreadsheet_id"], tab)
+
+    server, url = start_server(fake, port=args.port)
+    print(f"🧪 Fake Gmail/Sheets listening on {url} (set \"google_api_endpoint\" to this URL)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,19 @@
 import os
 import base64
+import json
 import re
+import threading
 from datetime import datetime
 from pathlib import Path
 
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-
 from config_loader import load_config
+from google_clients import get_gmail_service
 from logger import setup_logger
+from metrics import span
 
 logger = setup_logger(name="gmail_parser")
 config = load_config()
 
-TOKEN_PATH = Path("token.json")
-CLIENT_SECRET_PATH = Path(config["gmail_credentials_path"])
-SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
-
-def get_gmail_service():
-    creds = None
-    if TOKEN_PATH.exists():
-        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(str(CLIENT_SECRET_PATH), SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_PATH, "w") as token:
-            token.write(creds.to_json())
-    return build('gmail', 'v1', credentials=creds)
-
 def extract_otp_and_amount(body):
     otp_match = re.search(r'\b\d{6}\b', body)
     amount_match = re.search(r'Rs[ ]?([\d,]+(?:\.\d{1,2})?)', body)
@@ -41,45 +22,181 @@ def extract_otp_and_amount(body):
     logger.info(f"Extracted from email body → OTP: {otp}, Amount: {amount}")
     return otp, float(amount) if amount else None
 
+# Only the parts parse_message reads: Date header and the text/plain body
+MESSAGE_FIELDS = "id,payload(headers(name,value),body/data,parts(mimeType,body/data))"
+GMAIL_BATCH_LIMIT = 100  # Hard per-batch cap of the Gmail batch endpoint
+
+def get_messages(service, msg_ids):
+    """
+    Fetch several messages through Gmail's batch endpoint, `gmail_batch_size` per HTTP round trip.
+    Returns {message id: response dict or the exception raised for it}.
+    """
+    batch_size = max(1, min(int(config.get("gmail_batch_size", 50)), GMAIL_BATCH_LIMIT))
+    results = {}
+
+    def on_response(request_id, response, exception):
+        results[request_id] = exception if exception is not None else response
+
+    for start in range(0, len(msg_ids), batch_size):
+        batch = service.new_batch_http_request(callback=on_response)
+        for msg_id in msg_ids[start:start + batch_size]:
+            batch.add(
+                service.users().messages().get(userId='me', id=msg_id, format='full', fields=MESSAGE_FIELDS),
+                request_id=msg_id
+            )
+        try:
+            batch.execute()
+        except Exception as e:
+            for msg_id in msg_ids[start:start + batch_size]:
+                results.setdefault(msg_id, e)
+
+    for msg_id in msg_ids:
+        results.setdefault(msg_id, RuntimeError("no response in batch"))
+    return results
+
+def parse_message(msg_id, msg_data):
+    """Turn a messages().get response into an OTP entry, or None if it carries no OTP."""
+    payload = msg_data.get('payload', {})
+    headers = payload.get('headers', [])
+    date_header = next((h['value'] for h in headers if h['name'] == 'Date'), None)
+    timestamp = datetime.strptime(date_header, '%a, %d %b %Y %H:%M:%S %z') if date_header else None
+
+    parts = payload.get('parts', [])
+    body_data = ''
+    for part in parts:
+        if part.get('mimeType') == 'text/plain':
+            body_data = part['body'].get('data', '')
+            break
+    if not body_data and 'body' in payload:
+        body_data = payload['body'].get('data', '')
+
+    decoded_body = base64.urlsafe_b64decode(body_data.encode('ASCII')).decode('utf-8', errors='ignore')
+    otp, amount = extract_otp_and_amount(decoded_body)
+
+    if otp and amount:
+        return {
+            'timestamp': timestamp,
+            'otp': otp,
+            'amount': amount,
+            'raw': decoded_body,
+            'gmail_id': msg_id
+        }
+    return None
+
+# ─────────────────────────────────────────────
+# Parsed-message cache + history cursor
+# ─────────────────────────────────────────────
+# {
+#   "history_id": <mailbox historyId at the last sync>,
+#   "query": <gmail query the listing was made with>,
+#   "max_results": <listing size>,
+#   "latest_ids": [<message ids of the last listing, newest first>],
+#   "entries": { "<message id>": <OTP entry> or null for emails without an OTP }
+# }
+CACHE_PATH = Path("otp_cache.json")
+CACHE_MAX_ENTRIES = 500
+
+_cache_lock = threading.Lock()
+_cache = None
+
+def _load_cache():
+    global _cache
+    if _cache is None:
+        _cache = {"history_id": None, "query": None, "max_results": None, "latest_ids": [], "entries": {}}
+        if CACHE_PATH.exists():
+            try:
+                with open(CACHE_PATH, "r") as f:
+                    _cache = json.load(f)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not read OTP cache, starting fresh: {e}")
+    return _cache
+
+def _save_cache(cache):
+    # Drop entries that fell out of the listing once the cache grows past its cap
+    entries = cache["entries"]
+    if len(entries) > CACHE_MAX_ENTRIES:
+        keep = set(cache["latest_ids"])
+        for msg_id in [m for m in entries if m not in keep][:len(entries) - CACHE_MAX_ENTRIES]:
+            del entries[msg_id]
+
+    tmp_path = CACHE_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, CACHE_PATH)
+
+def _entry_to_json(entry):
+    if entry is None:
+        return None
+    return {**entry, 'timestamp': entry['timestamp'].isoformat() if entry['timestamp'] else None}
+
+def _entry_from_json(entry):
+    if entry is None:
+        return None
+    return {**entry, 'timestamp': datetime.fromisoformat(entry['timestamp']) if entry['timestamp'] else None}
+
+def _mailbox_changed(service, history_id):
+    """True if anything was added to the mailbox since `history_id` (or the cursor is unusable)."""
+    if not history_id:
+        return True
+    try:
+        history = service.users().history().list(
+            userId='me', startHistoryId=history_id, historyTypes=['messageAdded'], maxResults=1
+        ).execute()
+    except Exception as e:
+        # An expired cursor comes back as 404; fall back to a full listing
+        logger.info(f"History cursor {history_id} unusable ({type(e).__name__}); doing a full sync")
+        return True
+    return bool(history.get('history'))
+
+def cached_otps():
+    """OTP entries from the last sync, newest first, without touching the network."""
+    with _cache_lock:
+        cache = _load_cache()
+        entries = [cache["entries"].get(msg_id) for msg_id in cache["latest_ids"]]
+    return [_entry_from_json(e) for e in entries if e]
+
 def fetch_latest_otps(subject_filter='OTP', max_results=5):
-    service = get_gmail_service()
     query = config["gmail_query"]
-    otp_regex = config["otp_regex"]
-    results = service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
-    messages = results.get('messages', [])
 
-    otp_entries = []
-    for msg in messages:
-        try:
-            msg_data = service.users().messages().get(userId='me', id=msg['id']).execute()
-            payload = msg_data.get('payload', {})
-            headers = payload.get('headers', [])
-            date_header = next((h['value'] for h in headers if h['name'] == 'Date'), None)
-            timestamp = datetime.strptime(date_header, '%a, %d %b %Y %H:%M:%S %z') if date_header else None
-
-            parts = payload.get('parts', [])
-            body_data = ''
-            for part in parts:
-                if part.get('mimeType') == 'text/plain':
-                    body_data = part['body'].get('data', '')
-                    break
-            if not body_data and 'body' in payload:
-                body_data = payload['body'].get('data', '')
-
-            decoded_body = base64.urlsafe_b64decode(body_data.encode('ASCII')).decode('utf-8', errors='ignore')
-            otp, amount = extract_otp_and_amount(decoded_body)
-
-            if otp and amount:
-                otp_entries.append({
-                    'timestamp': timestamp,
-                    'otp': otp,
-                    'amount': amount,
-                    'raw': decoded_body,
-                    'gmail_id': msg['id']
-                })
+    with _cache_lock:
+        cache = _load_cache()
+        service = get_gmail_service()
 
-        except Exception as e:
-            logger.warning(f"Failed to process email ID {msg['id']}: {type(e).__name__} - {e}")
-            continue
+        listing_matches = cache["query"] == query and cache.get("max_results") == max_results
+        with span("gmail_history"):
+            unchanged = listing_matches and not _mailbox_changed(service, cache["history_id"])
+        if unchanged:
+            logger.info("📭 No new mail since last sync; serving OTPs from cache")
+        else:
+            # Read the cursor before listing so nothing that lands in between is missed
+            with span("gmail_list"):
+                history_id = service.users().getProfile(userId='me').execute().get('historyId')
+                results = service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
+            messages = results.get('messages', [])
+
+            failed = False
+            new_ids = [msg['id'] for msg in messages if msg['id'] not in cache["entries"]]
+            with span("gmail_get"):
+                fetched = get_messages(service, new_ids)
+            for msg_id, msg_data in fetched.items():
+                try:
+                    if isinstance(msg_data, Exception):
+                        raise msg_data
+                    cache["entries"][msg_id] = _entry_to_json(parse_message(msg_id, msg_data))
+                except Exception as e:
+                    logger.warning(f"Failed to process email ID {msg_id}: {type(e).__name__} - {e}")
+                    failed = True
+                    continue
+
+            # Without a cursor the next call re-lists and retries only the messages that failed
+            cache.update(
+                history_id=None if failed else history_id,
+                query=query,
+                max_results=max_results,
+                latest_ids=[m['id'] for m in messages]
+            )
+            _save_cache(cache)
+
+        entries = [cache["entries"].get(msg_id) for msg_id in cache["latest_ids"]]
 
-    return otp_entries
+    return [_entry_from_json(e) for e in entries if e]
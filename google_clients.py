@@ -0,0 +1,223 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from config_loader import load_config
+from logger import setup_logger
+
+logger = setup_logger(name="google_clients")
+config = load_config()
+
+# ─────────────────────────────────────────────
+# Process-wide Google API client pool
+# ─────────────────────────────────────────────
+# Credentials are loaded once and kept fresh by a background thread. Discovery-based services
+# are built once per process from the discovery documents bundled with googleapiclient
+# (no discovery fetch). httplib2 is not thread-safe, so requests go out over a per-thread
+# authorized connection that is reused for every call made from that thread.
+# The Google libraries are imported on first use, so importing this module costs nothing at startup.
+
+GMAIL_TOKEN_PATH = Path("token.json")
+GMAIL_CLIENT_SECRET_PATH = Path(config["gmail_credentials_path"])
+GMAIL_SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+
+SHEETS_CREDENTIALS_PATH = Path(config["sheets_credentials_path"])
+SHEETS_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# Base URL of a local stand-in for Google (see fake_google.py); empty means the real APIs
+API_ENDPOINT = (config.get("google_api_endpoint") or "").rstrip("/")
+
+REFRESH_MARGIN = timedelta(minutes=5)  # Refresh tokens this long before they expire
+REFRESH_CHECK_SECONDS = 60
+
+_lock = threading.RLock()
+_credentials = {}
+_local = threading.local()
+_services = {}
+_gspread_client = None
+_refresher = None
+
+
+def _load_gmail_credentials():
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    creds = None
+    if GMAIL_TOKEN_PATH.exists():
+        creds = Credentials.from_authorized_user_file(GMAIL_TOKEN_PATH, GMAIL_SCOPES)
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(str(GMAIL_CLIENT_SECRET_PATH), GMAIL_SCOPES)
+            creds = flow.run_local_server(port=0)
+        _save_gmail_token(creds)
+    return creds
+
+
+def _save_gmail_token(creds):
+    with open(GMAIL_TOKEN_PATH, "w") as token:
+        token.write(creds.to_json())
+
+
+def _load_sheets_credentials():
+    from google.oauth2 import service_account
+
+    if not SHEETS_CREDENTIALS_PATH.exists():
+        raise FileNotFoundError(f"Credential file not found: {SHEETS_CREDENTIALS_PATH.resolve()}")
+    return service_account.Credentials.from_service_account_file(
+        str(SHEETS_CREDENTIALS_PATH), scopes=SHEETS_SCOPES
+    )
+
+
+_LOADERS = {
+    "gmail": _load_gmail_credentials,
+    "sheets": _load_sheets_credentials,
+}
+
+
+def get_credentials(kind):
+    """Shared credentials for 'gmail' or 'sheets', loaded once per process."""
+    with _lock:
+        creds = _credentials.get(kind)
+        if creds is None:
+            if API_ENDPOINT:
+                # The local stand-in does not check tokens
+                from google.auth.credentials import AnonymousCredentials
+                creds = AnonymousCredentials()
+            else:
+                creds = _LOADERS[kind]()
+                _start_refresher()
+            _credentials[kind] = creds
+        return creds
+
+
+def _needs_refresh(creds):
+    if not creds.token or creds.expiry is None:
+        return not creds.valid
+    # google-auth keeps expiry as naive UTC
+    expiry = creds.expiry if creds.expiry.tzinfo else creds.expiry.replace(tzinfo=timezone.utc)
+    return expiry - datetime.now(timezone.utc) <= REFRESH_MARGIN
+
+
+def refresh_if_needed():
+    """Refresh any pooled credentials close to expiry."""
+    with _lock:
+        pooled = list(_credentials.items())
+    for kind, creds in pooled:
+        if not _needs_refresh(creds):
+            continue
+        try:
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+            if kind == "gmail":
+                _save_gmail_token(creds)
+            logger.info(f"🔑 Refreshed {kind} token (valid until {creds.expiry} UTC)")
+        except Exception as e:
+            logger.warning(f"⚠️ Background refresh of {kind} token failed: {e}")
+
+
+def _refresh_loop():
+    while True:
+        time.sleep(REFRESH_CHECK_SECONDS)
+        refresh_if_needed()
+
+
+def _start_refresher():
+    # Caller must hold _lock
+    global _refresher
+    if _refresher is None:
+        _refresher = threading.Thread(target=_refresh_loop, name="token-refresher", daemon=True)
+        _refresher.start()
+
+
+def _thread_http(kind):
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    http = connections.get(kind)
+    if http is None:
+        import google_auth_httplib2
+        import httplib2
+        http = google_auth_httplib2.AuthorizedHttp(get_credentials(kind), http=httplib2.Http())
+        connections[kind] = http
+    return http
+
+
+def _get_service(kind, api, version):
+    with _lock:
+        service = _services.get(api)
+        if service is None:
+            from googleapiclient import discovery_cache
+            from googleapiclient.discovery import build, build_from_document
+            from googleapiclient.http import HttpRequest
+
+            def request_builder(http, *args, **kwargs):
+                return HttpRequest(_thread_http(kind), *args, **kwargs)
+
+            if API_ENDPOINT:
+                # Same bundled discovery document, with every URL (batch included) rooted at the stand-in
+                document = json.loads(discovery_cache.get_static_doc(api, version))
+                document["rootUrl"] = f"{API_ENDPOINT}/"
+                service = build_from_document(
+                    document, http=_thread_http(kind), requestBuilder=request_builder
+                )
+            else:
+                service = build(
+                    api, version,
+                    http=_thread_http(kind),
+                    requestBuilder=request_builder,
+                    static_discovery=True
+                )
+            _services[api] = service
+        return service
+
+
+def get_gmail_service():
+    return _get_service("gmail", "gmail", "v1")
+
+
+def get_sheets_service():
+    return _get_service("sheets", "sheets", "v4")
+
+
+def get_gspread_client():
+    """Shared gspread client; its requests session keeps connections alive across pushes."""
+    global _gspread_client
+    import gspread
+
+    with _lock:
+        if _gspread_client is None:
+            if API_ENDPOINT:
+                _gspread_client = gspread.Client(get_credentials("sheets"), http_client=_endpoint_http_client())
+            else:
+                _gspread_client = gspread.authorize(get_credentials("sheets"))
+        return _gspread_client
+
+
+def _endpoint_http_client():
+    """gspread HTTP client class that sends Sheets calls to API_ENDPOINT instead of Google."""
+    from gspread.http_client import HTTPClient
+
+    class EndpointHTTPClient(HTTPClient):
+        def request(self, method, endpoint, *args, **kwargs):
+            endpoint = endpoint.replace("https://sheets.googleapis.com", API_ENDPOINT, 1)
+            return super().request(method, endpoint, *args, **kwargs)
+
+    return EndpointHTTPClient
+
+
+def warm_up():
+    """Load credentials and build clients ahead of the first user action."""
+    for name, getter in (("Gmail", get_gmail_service), ("Sheets", get_sheets_service), ("gspread", get_gspread_client)):
+        try:
+            getter()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not prepare {name} client: {e}")
+    refresh_if_needed()
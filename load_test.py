@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# ─────────────────────────────────────────────
+# Load driver for the get-OTP flow
+# ─────────────────────────────────────────────
+# Starts the fake Gmail/Sheets server (fake_google.py) in-process, points a scratch copy of the app
+# at it, and has N simulated clerks run the full flow concurrently: duplicate check → wait for the
+# bank's OTP email → log the transaction, while a background uploader pushes to Sheets as the app
+# does. Latency, error rates and quotas come from the "fake_google" section of config.json.
+#
+#   python load_test.py --clerks 8 --transactions 25
+#
+# Prints p50/p95/p99 per stage and writes them to load_test_results.json; the app's own stage
+# histograms (metrics.py) go next to it as load_test_results.prom.
+# Afterwards it checks that an OTP logged on another desktop (merged in by the Sheets pull) is not
+# handed out again, and exits non-zero if it is.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ["duplicate_check", "gmail_fetch", "otp_wait", "excel_write", "sheets_push", "sheets_pull", "total"]
+
+
+class StageTimes:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {stage: [] for stage in STAGES}
+        self.errors = {stage: 0 for stage in STAGES}
+
+    def record(self, stage, seconds, ok=True):
+        with self._lock:
+            self.samples[stage].append(seconds)
+            if not ok:
+                self.errors[stage] += 1
+
+    def timed(self, stage, func, *args, check=None, **kwargs):
+        """Call func, recording its duration; it counts as an error if it raises or check(result) is falsy."""
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = func(*args, **kwargs)
+            ok = check(result) if check else True
+            return result
+        finally:
+            self.record(stage, time.perf_counter() - started, ok)
+
+    def report(self):
+        report = {}
+        for stage in STAGES:
+            ordered = sorted(self.samples[stage])
+            if not ordered:
+                continue
+            pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+            report[stage] = {
+                "count": len(ordered),
+                "errors": self.errors[stage],
+                "p50_ms": round(pick(0.50), 2),
+                "p95_ms": round(pick(0.95), 2),
+                "p99_ms": round(pick(0.99), 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        return report
+
+
+def prepare_workdir(workdir, endpoint, overrides):
+    with open(os.path.join(REPO_DIR, "config.json"), "r") as f:
+        config = json.load(f)
+    config.update(
+        google_api_endpoint=endpoint,
+        transaction_log_excel_path="load_master.xlsx",
+        dry_run=False,
+        **overrides
+    )
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+    shutil.copy(os.path.join(REPO_DIR, "transaction_types.json"), workdir)
+    return config
+
+
+def check_remote_claim(fake, config):
+    """
+    An OTP another desktop logged (it reaches this one through the Sheets pull) must not be handed
+    to a new transaction here. Returns True if the matcher refuses it.
+    """
+    from downsync_from_google import pull_from_google_sheet
+    from otp_matcher import get_matcher
+    from transaction_journal import HEADERS, JOURNAL_TAB
+
+    amount = 99999.5
+    gmail_id, otp = fake.add_otp_email(amount)
+    entry = {"gmail_id": gmail_id, "otp": otp, "amount": amount, "timestamp": datetime.now()}
+    get_matcher().add_entries([entry])
+
+    sheet_tab = next(s for s, local in config["tab_mapping"].items() if local == JOURNAL_TAB)
+    values = fake.spreadsheet(config["spreadsheet_id"])[sheet_tab]["values"]
+    if not values:
+        values.append(list(HEADERS))
+    values.append([
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "REMOTE01", "", "Remote Desktop", "MV Tax",
+        str(amount), str(amount), otp, "remote-clerk", gmail_id, "", ""
+    ])
+    pull_from_google_sheet()
+    return get_matcher().claim(amount, config["amount_tolerance"]) is None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent get-OTP flows against fake Google APIs.")
+    parser.add_argument("--clerks", type=int, default=4)
+    parser.add_argument("--transactions", type=int, default=10, help="transactions per clerk")
+    parser.add_argument("--email-delay", type=float, default=2.0, help="max seconds before the bank email lands")
+    parser.add_argument("--pull-every", type=int, default=5, help="each clerk pulls from Sheets every N transactions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="load_test_results.json")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    with open(os.path.join(REPO_DIR, "config.json"), "r") as f:
+        fault_settings = json.load(f).get("fake_google", {})
+
+    # Project modules read config.json and open logs/ relative to the working directory,
+    # so switch to the scratch copy before importing any of them
+    workdir = tempfile.mkdtemp(prefix="otp_load_")
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+
+    from fake_google import FakeGoogle, start_server
+
+    fake = FakeGoogle(faults=fault_settings, seed=args.seed)
+    server, endpoint = start_server(fake)
+    config = prepare_workdir(workdir, endpoint, {"otp_poll_min_seconds": 1, "otp_poll_max_seconds": 2})
+    for tab in config.get("tab_mapping", {}).values():
+        fake.add_tab(config["spreadsheet_id"], tab)
+
+    import otp_poller
+    import sync_outbox
+    from downsync_from_google import pull_from_google_sheet
+    from duplication_check import is_recent_duplicate_transaction
+    from otp_flow import get_latest_valid_otp, record_otp
+    from sync_outbox import drain_outbox, pending_count
+    from synthetic_data import chassis_number, vehicle_number
+
+    times = StageTimes()
+
+    # The poller and the outbox call Gmail and Sheets on their own; time each of those round trips too
+    fetch = otp_poller.fetch_latest_otps
+    otp_poller.fetch_latest_otps = lambda *a, **kw: times.timed("gmail_fetch", fetch, *a, **kw)
+    push = sync_outbox.push_to_google_sheet
+    sync_outbox.push_to_google_sheet = lambda: times.timed("sheets_push", push, check=bool)
+    otp_poller.start_poller()
+
+    stop = threading.Event()
+
+    def uploader():
+        while not stop.is_set() or pending_count():
+            if pending_count():
+                drain_outbox()
+            else:
+                time.sleep(0.2)
+
+    def clerk(index):
+        rng = random.Random(args.seed * 1000 + index)
+        for n in range(args.transactions):
+            vehicle, chassis = vehicle_number(rng), chassis_number(rng)
+            bank_amount = 1000 + (index * args.transactions + n) * 7 + 0.5
+            rto_amount = bank_amount - 10
+            threading.Timer(rng.uniform(0, args.email_delay), fake.add_otp_email, args=(bank_amount,)).start()
+
+            started = time.perf_counter()
+            times.timed("duplicate_check", is_recent_duplicate_transaction,
+                        config["transaction_log_excel_path"], vehicle, chassis, "MV Tax", rto_amount, bank_amount)
+            data = times.timed("otp_wait", get_latest_valid_otp,
+                               vehicle, chassis, "Load Test", "MV Tax", rto_amount, bank_amount, f"clerk-{index}")
+            if data:
+                times.timed("excel_write", record_otp, data, check=bool)
+            times.record("total", time.perf_counter() - started, ok=bool(data))
+
+            if args.pull_every and (n + 1) % args.pull_every == 0:
+                times.timed("sheets_pull", pull_from_google_sheet)
+
+    print(f"🧪 {args.clerks} clerk(s) × {args.transactions} transaction(s) against {endpoint}")
+    upload_thread = threading.Thread(target=uploader, name="load-uploader")
+    upload_thread.start()
+    started = time.perf_counter()
+    clerks = [threading.Thread(target=clerk, args=(i,), name=f"clerk-{i}") for i in range(args.clerks)]
+    for thread in clerks:
+        thread.start()
+    for thread in clerks:
+        thread.join()
+    stop.set()
+    upload_thread.join()
+    elapsed = time.perf_counter() - started
+    remote_claim_ok = check_remote_claim(fake, config)
+    server.shutdown()
+
+    from metrics import write_metrics
+    write_metrics(os.path.splitext(output_path)[0] + ".prom")
+
+    report = times.report()
+    print(f"{'stage':<16}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in report.items():
+        print(f"{stage:<16}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    completed = report.get("total", {}).get("count", 0) - report.get("total", {}).get("errors", 0)
+    print(f"✅ {completed} OTP(s) matched and logged in {elapsed:.1f}s ({completed / elapsed:.2f}/s)")
+    if remote_claim_ok:
+        print("✅ OTP logged on another desktop was not handed out again")
+    else:
+        print("❌ OTP logged on another desktop was handed out again")
+
+    with open(output_path, "w") as f:
+        json.dump({
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "clerks": args.clerks,
+            "transactions_per_clerk": args.transactions,
+            "faults": fault_settings,
+            "elapsed_s": round(elapsed, 3),
+            "stages": report,
+            "remote_claim_refused": remote_claim_ok,
+        }, f, indent=2)
+
+    os.chdir(REPO_DIR)
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if not remote_claim_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,136 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+import threading
 from pathlib import Path
 from datetime import datetime
-import shutil
 
-def setup_logger(name="gmail_fetcher", log_file="logs/debug.log", level=logging.INFO):
-    # Ensure the logs directory exists
-    Path("logs").mkdir(exist_ok=True)
-
-    # Monday log rotation: backup and truncate
-    if datetime.today().weekday() == 0:  # Monday = 0
-        try:
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
-            backup_file = f"logs/debug_{timestamp}.log"
-            shutil.copy2(log_file, backup_file)
-            Path(log_file).write_text("")  # Truncate
-        except FileNotFoundError:
-            # If log_file doesn't exist yet, it's okay to skip rotation
-            pass
-        except Exception as e:
-            print(f"Log rotation failed: {e}")
+from config_loader import load_config
+
+# ─────────────────────────────────────────────
+# Shared logging pipeline
+# ─────────────────────────────────────────────
+# Every module's logger gets the same QueueHandler, so logger.info() only enqueues the record; one
+# QueueListener thread per log file does the disk writes. That one file handler also owns rotation,
+# so it happens exactly once however many modules import this. Settings come from config.json:
+#
+#   "log_rotation": "size" (default) or "weekly" (Monday midnight, like the old manual rotation)
+#   "log_max_bytes": 5000000, "log_backup_count": 5, "log_json": false (one JSON object per line)
+
+DEFAULT_MAX_BYTES = 5_000_000
+DEFAULT_BACKUP_COUNT = 5
+
+_pipelines = {}  # log file -> QueueHandler feeding its listener
+_listeners = []
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for tools that parse the log."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Like QueueHandler, but the traceback travels as text in exc_text instead of being folded into
+    the message (the stock prepare() drops exc_info), so the file's formatter places it itself.
+    """
+
+    _formatter = logging.Formatter()
+
+    def prepare(self, record):
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = self._formatter.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+
+def _log_settings():
+    try:
+        return load_config()
+    except Exception:
+        # Missing or invalid config: log with defaults; the caller that needs config will raise
+        return {}
+
+
+def _file_handler(log_file, settings):
+    if settings.get("log_rotation") == "weekly":
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when="W0", backupCount=settings.get("log_backup_count", DEFAULT_BACKUP_COUNT), encoding="utf-8"
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=settings.get("log_max_bytes", DEFAULT_MAX_BYTES),
+            backupCount=settings.get("log_backup_count", DEFAULT_BACKUP_COUNT),
+            encoding="utf-8"
+        )
 
     # Format for each log entry
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    if settings.get("log_json"):
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    return handler
+
+
+def _pipeline(log_file):
+    with _lock:
+        queue_handler = _pipelines.get(log_file)
+        if queue_handler is None:
+            Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+            log_queue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(log_queue, _file_handler(log_file, _log_settings()))
+            listener.start()
+            _listeners.append(listener)
+            queue_handler = _pipelines[log_file] = _QueueHandler(log_queue)
+        return queue_handler
 
-    # Create file handler with UTF-8 encoding
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setFormatter(formatter)
 
+def stop_logging():
+    # Flush whatever is still queued; registered with atexit, safe to call more than once
+    with _lock:
+        while _listeners:
+            _listeners.pop().stop()
+        _pipelines.clear()
+
+
+atexit.register(stop_logging)
+
+
+def setup_logger(name="gmail_fetcher", log_file="logs/debug.log", level=logging.INFO):
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
     # Prevent adding multiple handlers on repeated calls
-    if not logger.hasHandlers():
-        logger.addHandler(file_handler)
+    queue_handler = _pipeline(log_file)
+    if queue_handler not in logger.handlers:
+        logger.addHandler(queue_handler)
+    # Records stop at the queue; passed up, they would reach the root logger's synchronous handlers
+    logger.propagate = False
 
     return logger
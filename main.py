@@ -1,45 +1,96 @@
+import time
+
+STARTED = time.perf_counter()
+
 from config_loader import load_config
 from logger import setup_logger
 from ui_app import launch_ui
-from downsync_from_google import pull_from_google_sheet
-from sync_to_google import push_to_google_sheet
-from downsync_from_google import refresh_transaction_types
 from pathlib import Path
-import json
+import argparse
 import threading
 
 logger = setup_logger("otp_utility")
 
-# 🔧 Load configuration
-CONFIG_PATH = Path("config.json")
-with open(CONFIG_PATH, "r") as f:
-    config = json.load(f)
+# 🔧 Load configuration (parsed once and shared by every module)
+config = load_config()
 
 MASTER_SHEET_PATH = Path(config["transaction_log_excel_path"])
 
-config = load_config()
+# The Google clients, gspread and openpyxl are only imported once the window is on screen:
+# start_services() runs behind the drawn form, and the OTP flow loads them on first use.
 
 def sync_config():
+    from downsync_from_google import pull_from_google_sheet, refresh_transaction_types
+
     pull_from_google_sheet()
     refresh_transaction_types(excel_path=MASTER_SHEET_PATH,tab_name="Transaction_Types",json_path=Path("transaction_types.json"))
 
 def background_sync():
+    from google_clients import warm_up
+
+    # Authenticate and build API clients before the clerk's first click
+    warm_up()
     try:
         sync_config()
         logger.info("✅ Background config sync complete")
     except Exception as e:
         logger.warning(f"⚠️ Background sync failed: {e}")
 
+def start_services():
+    from metrics import start_exporter
+    from otp_poller import start_poller
+    from sync_outbox import start_uploader
+
+    # 📈 Stage timings in Prometheus text format (file and/or http://127.0.0.1:<port>/metrics)
+    start_exporter(
+        path=config.get("metrics_file"),
+        port=config.get("metrics_port"),
+        interval=config.get("metrics_interval_seconds", 15)
+    )
+
+    # 📤 Upload queued changes to Google Sheets without blocking the clerk
+    start_uploader()
+
+    # 📬 Keep recent OTP emails buffered so "Fetch OTP" can match instantly
+    start_poller()
+
+    background_sync()
+
+def on_first_paint():
+    logger.info(f"🖥️ Window drawn {time.perf_counter() - STARTED:.2f}s after start")
+
+    # 🚀 Start background services and sync once the form is visible
+    threading.Thread(target=start_services, name="startup", daemon=True).start()
+
 def main():
-    
-    logger.info("Launching OTP Utility UI")
+    parser = argparse.ArgumentParser(description="Secure OTP Utility")
+    parser.add_argument("--serve", action="store_true", help="run the headless HTTP/JSON service instead of the window")
+    parser.add_argument("--host", help="service address (default: service_host in config.json)")
+    parser.add_argument("--port", type=int, help="service port (default: service_port in config.json)")
+    args = parser.parse_args()
+
+    if args.serve:
+        from otp_service import serve
+
+        logger.info("Launching headless OTP service")
+        threading.Thread(target=start_services, name="startup", daemon=True).start()
+        serve(args.host, args.port)
+    else:
+        logger.info("Launching OTP Utility UI")
+        launch_ui(on_paint=on_first_paint)
+
+    from excel_logger import export_transaction_log
+    from metrics import write_metrics
+    from sync_outbox import drain_outbox, enqueue_sync
 
-    # 🚀 Start background sync before launching UI
-    threading.Thread(target=background_sync, daemon=True).start()
+    export_transaction_log(MASTER_SHEET_PATH)
 
-    launch_ui()
+    # Last attempt before exit; anything still pending is retried on the next start
+    enqueue_sync("exit")
+    drain_outbox()
 
-    push_to_google_sheet()
+    if config.get("metrics_file"):
+        write_metrics(config["metrics_file"])
 
 if __name__ == "__main__":
     main()
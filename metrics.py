@@ -0,0 +1,201 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ─────────────────────────────────────────────
+# Stage timings and counters (Prometheus text format)
+# ─────────────────────────────────────────────
+# Wrap a stage in `with span("gmail_list"):` (or decorate with @timed("get_otp")). Every span feeds
+# the otp_stage_duration_seconds histogram, and spans that raise also bump otp_stage_errors_total.
+# start_exporter() publishes the registry to a file and/or http://127.0.0.1:<port>/metrics.
+# Standard library only, so readpdf/ and the tools can import it too.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        return [(self.name, _label_text(self.labels, key), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with _lock:
+            self._values[key] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def samples(self):
+        lines = []
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _format(bound)
+                lines.append((f"{self.name}_bucket", _label_text(self.labels + ("le",), key + (le,)), cumulative))
+            lines.append((f"{self.name}_sum", _label_text(self.labels, key), series[-1]))
+            lines.append((f"{self.name}_count", _label_text(self.labels, key), cumulative))
+        return lines
+
+
+STAGE_SECONDS = Histogram("otp_stage_duration_seconds", "Time spent in each stage of the OTP utility.", ["stage"])
+STAGE_ERRORS = Counter("otp_stage_errors_total", "Stages that raised or reported failure.", ["stage"])
+TRANSACTION_LOG_ROWS = Gauge("otp_transaction_log_rows", "Rows written to the transaction journal so far.")
+
+
+@contextmanager
+def span(stage):
+    """Time the block as `stage`; an exception counts as an error for the stage and is re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def timed(stage):
+    """Decorator form of span()."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe(stage, seconds):
+    """Record a duration measured elsewhere (e.g. in a worker process)."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def count_error(stage):
+    """Count a failure a stage reported without raising."""
+    STAGE_ERRORS.inc(stage=stage)
+
+
+def render():
+    """The whole registry in Prometheus text exposition format."""
+    out = []
+    with _lock:
+        for metric in _registry:
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                out.append(f"{name}{labels} {_format(value)}")
+    return "\n".join(out) + "\n"
+
+
+def write_metrics(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+_exporter = None
+
+
+def start_exporter(path=None, port=None, interval=15):
+    """
+    Publish metrics: rewrite `path` every `interval` seconds and/or serve them on
+    http://127.0.0.1:<port>/metrics. Either may be None/0 to leave it off.
+    """
+    global _exporter
+    if _exporter is not None or not (path or port):
+        return
+    _exporter = {}
+
+    if port:
+        server = ThreadingHTTPServer(("127.0.0.1", int(port)), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        _exporter["server"] = server
+
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        def write_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    write_metrics(path)
+                except OSError:
+                    pass
+
+        threading.Thread(target=write_loop, name="metrics-file", daemon=True).start()
+        _exporter["path"] = path
@@ -0,0 +1,144 @@
+from config_loader import load_config
+from duplication_check import is_recent_duplicate_transaction
+from excel_logger import log_otp_to_excel
+from gmail_parser import fetch_latest_otps, cached_otps
+from logger import setup_logger
+from metrics import span, timed
+from otp_matcher import get_matcher
+from otp_poller import get_poller
+from sync_outbox import enqueue_sync
+from transaction_journal import DuplicateEntryError
+
+config = load_config()
+logger = setup_logger("otp_ui")
+
+# ─────────────────────────────────────────────
+# Get-OTP flow, independent of the Tk window
+# ─────────────────────────────────────────────
+# ui_app feeds it the form values; otp_service and the load driver call it directly.
+
+# OTP matching logic
+def claim_matching_entry(otp_entries, bank_amount):
+    # Reserves the best unclaimed OTP so concurrent transactions cannot be given the same one
+    with span("otp_match"):
+        entry = get_matcher().claim(bank_amount, config["amount_tolerance"], otp_entries)
+    if entry:
+        logger.info(f"Email amount {entry['amount']} matched bank amount {bank_amount} (tolerance {config['amount_tolerance']})")
+    return entry
+
+@timed("otp_wait")
+def get_latest_valid_otp(vehicle_reg, chassis_number, owner_name, payment_type, rto_amount, bank_amount, employee_name):
+    try:
+        poller = get_poller()
+        if poller.running:
+            # Match against the poller's buffer, waiting a while for the bank email to land
+            entry = poller.wait_for(
+                lambda entries: claim_matching_entry(entries, bank_amount),
+                timeout=config.get("otp_wait_seconds", 30)
+            )
+        else:
+            entry = claim_matching_entry(fetch_latest_otps(), bank_amount)
+
+        if entry:
+            logger.info(f"OTP matched for {vehicle_reg} by {employee_name}: {entry['otp']}")
+            return {
+                "otp": entry["otp"],
+                "timestamp": entry["timestamp"],
+                "vehicle_reg": vehicle_reg,
+                "chassis_number": chassis_number,
+                "owner_name": owner_name,
+                "payment_type": payment_type,
+                "rto_amount": rto_amount,
+                "bank_amount": bank_amount,
+                "employee_name": employee_name,
+                "gmail_id": entry["gmail_id"],
+                "raw": entry["raw"]
+            }
+        logger.warning(f"No matching OTP found for {vehicle_reg}")
+        return None
+    except Exception as e:
+        logger.error(f"OTP fetch failed: {e}")
+        return None
+
+def record_otp(data):
+    # Log the transaction, then make the OTP's claim permanent and queue the Sheets upload.
+    # Entries without a gmail_id (OTP keyed in by hand) have no claim to settle.
+    # Returns False if the OTP email already backs a different logged transaction.
+    gmail_id = data.get("gmail_id")
+    try:
+        with span("excel_write"):
+            log_otp_to_excel(data)
+    except DuplicateEntryError as e:
+        if gmail_id:
+            get_matcher().release(gmail_id)
+        logger.warning(f"Transaction not logged: {e}")
+        return False
+    except Exception:
+        if gmail_id:
+            get_matcher().release(gmail_id)
+        raise
+    if gmail_id:
+        get_matcher().confirm(gmail_id)
+    enqueue_sync(f"OTP logged for {data['vehicle_reg'] or data['chassis_number']}")
+    logger.info("OTP logged and queued for Google Sheets sync")
+    return True
+
+@timed("get_otp")
+def request_otp(vehicle_number, chassis_number, owner_name, payment_type, rto_amount, bank_amount, employee_name,
+                on_otp=None, record=record_otp):
+    """
+    Run the whole get-OTP flow for one transaction. Returns (status, message, data) where status is
+    "invalid", "duplicate", "matched", "mismatch" or "no_otp" and data is the logged entry when matched.
+    `on_otp(data, message)` is called as soon as an OTP is matched, before `record(data)` logs it;
+    `record` may return False to reject the entry as a duplicate.
+    """
+    if payment_type == "Select Payment Type" or not payment_type:
+        logger.warning("Payment type not selected.")
+        return "invalid", "❌ Please select a valid payment type.", None
+
+    if not vehicle_number and not chassis_number:
+        logger.warning("Both Vehicle Number and Chassis Number are empty.")
+        return "invalid", "❌ Please enter either Vehicle Number or Chassis Number.", None
+
+    excel_path = config["transaction_log_excel_path"]
+    with span("duplicate_check"):
+        duplicate = is_recent_duplicate_transaction(
+            excel_path,
+            vehicle_number,
+            chassis_number,
+            payment_type,
+            rto_amount,
+            bank_amount
+        )
+    if duplicate:
+        logger.warning(f"Duplicate transaction detected for Vehicle: {vehicle_number} or Chassis: {chassis_number}")
+        return "duplicate", "⚠️ Duplicate transaction detected.\nPlease check Vehicle Number / Payment Type.", None
+
+    data = get_latest_valid_otp(
+        vehicle_number,
+        chassis_number,
+        owner_name,
+        payment_type,
+        rto_amount,
+        bank_amount,
+        employee_name
+    )
+
+    if data:
+        message = f"✅ OTP: {data['otp']}"
+        if on_otp:
+            on_otp(data, message)
+        logger.info(f"OTP displayed for {data['vehicle_reg']}")
+        if record(data) is False:
+            logger.warning(f"Transaction for {data['vehicle_reg'] or data['chassis_number']} was not logged (already logged, or its OTP email was used)")
+            return "duplicate", "⚠️ Duplicate transaction detected.\nPlease check Vehicle Number / Payment Type.", None
+        return "matched", message, data
+
+    # The lookup above just refreshed the buffer/cache; no need to hit Gmail again
+    poller = get_poller()
+    otp_entries = poller.snapshot() if poller.running else cached_otps()
+    if otp_entries:
+        logger.warning("OTP(s) found, but none matched the bank amount")
+        return "mismatch", "⚠️ No OTP matched: Amount mismatch", None
+    logger.warning("No OTP emails found in inbox")
+    return "no_otp", "❌ No OTP found in inbox", None
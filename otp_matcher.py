@@ -0,0 +1,126 @@
+import bisect
+import threading
+from collections import deque
+
+from logger import setup_logger
+from transaction_journal import is_logged, logged_gmail_ids
+
+logger = setup_logger(name="otp_matcher")
+
+# ─────────────────────────────────────────────
+# OTP matching engine
+# ─────────────────────────────────────────────
+# Candidate OTP entries are kept sorted by amount so the tolerance window is found with bisection.
+# Within the window the closest amount wins, ties going to the most recent email. A matched OTP is
+# reserved for the transaction that took it and becomes permanently claimed once that transaction
+# is logged; OTPs already in the transaction journal start out claimed. The journal also receives
+# rows other desktops logged (through the Sheets pull), so a candidate is checked against it once
+# more before it is handed out.
+
+def _recency(entry):
+    return entry["timestamp"].timestamp() if entry.get("timestamp") else 0.0
+
+
+class OtpMatcher:
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._amounts = []   # sorted amounts, parallel to _ids
+        self._ids = []
+        self._entries = {}   # gmail_id -> entry
+        self._order = deque()  # insertion order, for eviction
+        self._reserved = set()
+        self._claimed = None  # loaded lazily from the journal
+
+    def _ensure_claims(self):
+        # Caller must hold _lock
+        if self._claimed is None:
+            self._claimed = set(logged_gmail_ids())
+
+    def _insert(self, entry):
+        gmail_id = entry["gmail_id"]
+        if gmail_id in self._entries or entry.get("amount") is None:
+            return
+        position = bisect.bisect_right(self._amounts, entry["amount"])
+        self._amounts.insert(position, entry["amount"])
+        self._ids.insert(position, gmail_id)
+        self._entries[gmail_id] = entry
+        self._order.append(gmail_id)
+
+        while len(self._order) > self.max_entries:
+            self._remove(self._order.popleft())
+
+    def _remove(self, gmail_id):
+        entry = self._entries.pop(gmail_id)
+        low = bisect.bisect_left(self._amounts, entry["amount"])
+        high = bisect.bisect_right(self._amounts, entry["amount"])
+        position = self._ids.index(gmail_id, low, high)
+        del self._amounts[position]
+        del self._ids[position]
+
+    def add_entries(self, entries):
+        with self._lock:
+            for entry in entries:
+                self._insert(entry)
+
+    def claim(self, amount, tolerance, entries=()):
+        """
+        Reserve and return the best unclaimed OTP within `tolerance` of `amount`, or None.
+        `entries` are merged into the candidate set first.
+        """
+        amount = float(amount)
+        with self._lock:
+            self._ensure_claims()
+            for entry in entries:
+                self._insert(entry)
+
+            low = bisect.bisect_left(self._amounts, amount - tolerance)
+            high = bisect.bisect_right(self._amounts, amount + tolerance)
+            candidates = []
+            for gmail_id in self._ids[low:high]:
+                if gmail_id in self._claimed or gmail_id in self._reserved:
+                    continue
+                entry = self._entries[gmail_id]
+                candidates.append(((abs(entry["amount"] - amount), -_recency(entry)), gmail_id))
+
+            for _, gmail_id in sorted(candidates):
+                if is_logged(gmail_id):
+                    # Used on another desktop and merged in since the claims were loaded
+                    self._claimed.add(gmail_id)
+                    continue
+                entry = self._entries[gmail_id]
+                self._reserved.add(gmail_id)
+                break
+            else:
+                return None
+
+        logger.info(f"🔒 Reserved OTP from email {entry['gmail_id']} for amount {amount}")
+        return entry
+
+    def confirm(self, gmail_id):
+        """Mark a reserved OTP as used for good (call once the transaction is logged)."""
+        with self._lock:
+            self._ensure_claims()
+            self._reserved.discard(gmail_id)
+            self._claimed.add(gmail_id)
+
+    def release(self, gmail_id):
+        """Give a reserved OTP back, e.g. when logging the transaction failed."""
+        with self._lock:
+            self._reserved.discard(gmail_id)
+
+    def is_claimed(self, gmail_id):
+        with self._lock:
+            self._ensure_claims()
+            return gmail_id in self._claimed or gmail_id in self._reserved
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+def get_matcher():
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            _matcher = OtpMatcher()
+        return _matcher
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import deque
+
+from config_loader import load_config
+from gmail_parser import fetch_latest_otps
+from logger import setup_logger
+
+logger = setup_logger(name="otp_poller")
+config = load_config()
+
+# ─────────────────────────────────────────────
+# Background inbox poller
+# ─────────────────────────────────────────────
+# Keeps the most recent OTP entries (same dicts fetch_latest_otps returns) in a bounded ring
+# buffer. The interval starts at `otp_poll_min_seconds`, doubles while the inbox is quiet up to
+# `otp_poll_max_seconds`, and drops back to the minimum when new mail arrives or a clerk is waiting.
+
+class OtpPoller:
+    def __init__(self, min_interval=3, max_interval=60, buffer_size=50, max_results=10):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_results = max_results
+        self.interval = min_interval
+        self._buffer = deque(maxlen=buffer_size)
+        self._seen = set()
+        self._waiters = 0
+        self._changed = threading.Condition()
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        # main's startup thread and the headless service may both call this
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="otp-poller", daemon=True)
+            self._thread.start()
+        logger.info(f"📬 OTP poller started (every {self.min_interval}-{self.max_interval}s)")
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def poke(self):
+        """Poll right away instead of waiting out the current interval."""
+        self.interval = self.min_interval
+        self._wake.set()
+
+    def snapshot(self):
+        """Buffered entries, newest first."""
+        with self._changed:
+            return list(self._buffer)
+
+    def poll_once(self):
+        try:
+            entries = fetch_latest_otps(max_results=self.max_results)
+        except Exception as e:
+            logger.warning(f"⚠️ Inbox poll failed: {type(e).__name__} - {e}")
+            return False
+
+        # fetch_latest_otps lists newest first; add oldest first so the newest ends up at the front.
+        # Anything beyond the buffer size would only be evicted again and re-added on the next poll.
+        added = 0
+        with self._changed:
+            for entry in reversed(entries[:self._buffer.maxlen]):
+                if entry["gmail_id"] in self._seen:
+                    continue
+                if len(self._buffer) == self._buffer.maxlen:
+                    self._seen.discard(self._buffer[-1]["gmail_id"])
+                self._buffer.appendleft(entry)
+                self._seen.add(entry["gmail_id"])
+                added += 1
+            if added:
+                self._changed.notify_all()
+
+        if added:
+            logger.info(f"📥 Poller buffered {added} new OTP email(s)")
+        return bool(added)
+
+    def _run(self):
+        while True:
+            got_new = self.poll_once()
+            with self._changed:
+                waiting = self._waiters > 0
+            if got_new or waiting:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * 2, self.max_interval)
+
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def wait_for(self, find, timeout):
+        """
+        Return find(snapshot) as soon as it is truthy, re-checking whenever new OTPs arrive,
+        or None once `timeout` seconds have passed.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            self._waiters += 1
+        self.poke()
+        try:
+            with self._changed:
+                while True:
+                    found = find(list(self._buffer))
+                    if found:
+                        return found
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._changed.wait(remaining)
+        finally:
+            with self._changed:
+                self._waiters -= 1
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+def get_poller():
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = OtpPoller(
+                min_interval=config.get("otp_poll_min_seconds", 3),
+                max_interval=config.get("otp_poll_max_seconds", 60),
+                buffer_size=config.get("otp_buffer_size", 50),
+                max_results=config.get("otp_poll_max_results", 10)
+            )
+        return _poller
+
+def start_poller():
+    poller = get_poller()
+    poller.start()
+    return poller
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+
+from config_loader import load_config
+from duplicate_index import make_keys
+from duplication_check import is_recent_duplicate_transaction
+from logger import setup_logger
+from otp_flow import record_otp, request_otp
+from otp_matcher import get_matcher
+from otp_poller import get_poller, start_poller
+from sync_outbox import pending_count, start_uploader
+
+logger = setup_logger("otp_service")
+config = load_config()
+
+# ─────────────────────────────────────────────
+# Headless multi-clerk OTP service
+# ─────────────────────────────────────────────
+# Local HTTP/JSON front end to the same get-OTP flow the Tk window runs (`python main.py --serve`).
+# An asyncio loop accepts every clerk's request; the blocking work runs on a thread pool. All
+# requests share the process-wide poller (one Gmail mailbox watch), the OTP matcher and the sync
+# outbox, and every journal write goes through a single writer thread.
+#
+#   GET  /health            poller and outbox state
+#   POST /duplicate-check   {vehicle_number, chassis_number, payment_type, rto_amount, bank_amount}
+#   POST /otp               the form fields (plus owner_name, employee_name): match, log, return the OTP
+#   POST /log               form fields plus otp (and gmail_id/timestamp if known): log an OTP obtained elsewhere
+
+EXCEL_PATH = config["transaction_log_excel_path"]
+MAX_BODY_BYTES = 64 * 1024
+
+FIELDS = ("vehicle_number", "chassis_number", "owner_name", "payment_type", "rto_amount", "bank_amount", "employee_name")
+
+# request_otp statuses that are the caller's problem; the rest are normal outcomes
+STATUS_CODES = {"invalid": 400, "duplicate": 409}
+
+
+def _form(payload):
+    # Same shape the Tk form hands over: stripped strings
+    return {name: str(payload.get(name) or "").strip() for name in FIELDS}
+
+
+def _result(status, message, data=None):
+    result = {"status": status, "message": message}
+    if data:
+        result.update(
+            otp=data["otp"],
+            gmail_id=data.get("gmail_id", ""),
+            timestamp=data["timestamp"].strftime("%Y-%m-%d %H:%M:%S") if data["timestamp"] else ""
+        )
+    return result
+
+
+class OtpService:
+    def __init__(self, max_pending=32):
+        # Waiting for an OTP email blocks a thread for up to otp_wait_seconds, hence the pool size
+        self.requests = ThreadPoolExecutor(max_workers=max_pending, thread_name_prefix="otp-request")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal-writer")
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("POST", "/duplicate-check"): self.duplicate_check,
+            ("POST", "/otp"): self.get_otp,
+            ("POST", "/log"): self.log_transaction,
+        }
+
+    def write(self, func, *args):
+        """Run func on the journal writer thread and wait for it."""
+        return self.writer.submit(func, *args).result()
+
+    def check_and_record(self, data):
+        # Runs on the writer thread, so no other write can land between the check and the append
+        if is_recent_duplicate_transaction(
+            EXCEL_PATH, data["vehicle_reg"], data["chassis_number"], data["payment_type"],
+            data["rto_amount"], data["bank_amount"]
+        ):
+            return False
+        return record_otp(data)
+
+    # ── Operations (run on the request pool) ──
+
+    def health(self, payload):
+        poller = get_poller()
+        return 200, {
+            "status": "ok",
+            "poller_running": poller.running,
+            "buffered_otps": len(poller.snapshot()),
+            "pending_sync": pending_count(),
+            "in_flight": len(self._in_flight),
+        }
+
+    def duplicate_check(self, payload):
+        form = _form(payload)
+        duplicate = is_recent_duplicate_transaction(
+            EXCEL_PATH,
+            form["vehicle_number"],
+            form["chassis_number"],
+            form["payment_type"],
+            form["rto_amount"],
+            form["bank_amount"]
+        )
+        return 200, {"duplicate": duplicate}
+
+    def get_otp(self, payload):
+        form = _form(payload)
+        try:
+            # The duplicate index's keys (one per identifier), so vehicle or chassis alone collide
+            keys = set(make_keys(
+                form["vehicle_number"], form["chassis_number"], form["payment_type"],
+                form["rto_amount"], form["bank_amount"]
+            ))
+        except (TypeError, ValueError):
+            return 400, _result("invalid", "❌ RTO and bank amounts must be numbers.")
+
+        # Two clerks submitting the same transaction at once would both pass the duplicate check
+        with self._in_flight_lock:
+            if keys & self._in_flight:
+                return 409, _result("duplicate", "⚠️ This transaction is already being processed.")
+            self._in_flight |= keys
+
+        def record(data):
+            # Checked again at write time: the transaction may have been logged (by /log or another
+            # desktop) while this request waited for its OTP email
+            if self.write(self.check_and_record, data):
+                return True
+            if data.get("gmail_id"):
+                get_matcher().release(data["gmail_id"])
+            return False
+
+        try:
+            status, message, data = request_otp(**form, record=record)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= keys
+        return STATUS_CODES.get(status, 200), _result(status, message, data)
+
+    def log_transaction(self, payload):
+        form = _form(payload)
+        otp = str(payload.get("otp") or "").strip()
+        if not otp:
+            return 400, _result("invalid", "❌ Please provide the OTP to log.")
+        if not form["vehicle_number"] and not form["chassis_number"]:
+            return 400, _result("invalid", "❌ Please enter either Vehicle Number or Chassis Number.")
+        try:
+            timestamp = datetime.strptime(payload["timestamp"], "%Y-%m-%d %H:%M:%S") if payload.get("timestamp") else datetime.now()
+        except (TypeError, ValueError):
+            return 400, _result("invalid", "❌ timestamp must look like 2024-01-31 14:05:00.")
+
+        data = {
+            "otp": otp,
+            "timestamp": timestamp,
+            "vehicle_reg": form["vehicle_number"],
+            "chassis_number": form["chassis_number"],
+            "owner_name": form["owner_name"],
+            "payment_type": form["payment_type"],
+            "rto_amount": form["rto_amount"],
+            "bank_amount": form["bank_amount"],
+            "employee_name": form["employee_name"],
+            "gmail_id": str(payload.get("gmail_id") or ""),
+            "raw": ""
+        }
+
+        if not self.write(self.check_and_record, data):
+            return 409, _result("duplicate", "⚠️ Duplicate transaction detected.\nPlease check Vehicle Number / Payment Type.")
+        return 200, _result("logged", "✅ Transaction logged", data)
+
+    # ── HTTP ──
+
+    async def dispatch(self, method, path, body):
+        handler = self.routes.get((method, path))
+        if handler is None:
+            known_path = any(route_path == path for _, route_path in self.routes)
+            return (405, {"error": "method not allowed"}) if known_path else (404, {"error": "not found"})
+        try:
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            return 400, {"error": f"invalid JSON body: {e}"}
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.requests, handler, payload)
+        except Exception as e:
+            logger.error(f"❌ {method} {path} failed: {type(e).__name__} - {e}")
+            return 500, {"error": str(e)}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    status, result, keep_alive = 413, {"error": "request body too large"}, False
+                else:
+                    body = await reader.readexactly(length)
+                    status, result = await self.dispatch(method, target.split("?")[0], body)
+
+                payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+                head = (
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                )
+                writer.write(head.encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, host, port, started=None):
+        """Serve until cancelled. `started(host, port)` is called once the socket is listening."""
+        server = await asyncio.start_server(self.handle, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        logger.info(f"🌐 OTP service listening on http://{host}:{port}")
+        if started:
+            started(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.requests.shutdown(wait=False, cancel_futures=True)
+        self.writer.shutdown(wait=True)
+
+
+def serve(host=None, port=None):
+    """Run the headless service until interrupted (Ctrl+C)."""
+    host = host or config.get("service_host", "127.0.0.1")
+    port = config.get("service_port", 8780) if port is None else port
+
+    # One mailbox watch and one uploader for every clerk (no-ops if main already started them)
+    start_poller()
+    start_uploader()
+
+    service = OtpService(config.get("service_max_pending", 32))
+    try:
+        asyncio.run(service.run(host, port))
+    except KeyboardInterrupt:
+        logger.info("🛑 OTP service stopped")
+    finally:
+        service.close()
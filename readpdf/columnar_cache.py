@@ -0,0 +1,228 @@
+# columnar_cache.py
+
+import importlib.util
+import io
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+# ─────────────────────────────────────────────
+# Columnar cache of the analysis inputs
+# ─────────────────────────────────────────────
+# load_dataset() keeps a typed Parquet mirror of each source (xlsx, the CSV receipts log, or the
+# transaction journal) under CACHE_DIR, with a small JSON sidecar recording what the mirror covers.
+#   - xlsx: re-read in full whenever the file's (mtime, size) changes
+#   - CSV log: append-only, so only the bytes written since the last load are parsed
+#   - journal: only rows with a seq above the last cached one are queried
+# Without pyarrow the sources are simply read directly, as before.
+
+CACHE_DIR = "columnar_cache"
+HAVE_PARQUET = importlib.util.find_spec("pyarrow") is not None
+
+# Date layouts seen in receipts and in the transaction log (journal entries use the ISO form)
+DATE_FORMATS = ("%d-%m-%Y", "%d-%b-%Y", "%d-%m-%Y %H:%M:%S", "%d-%b-%Y %I:%M %p", "%Y-%m-%d %H:%M:%S")
+DATE_COLUMNS = ("Transaction Date", "Logged At")
+AMOUNT_COLUMNS = ("RTO Amount", "Bank Amount", "Amount", "Grand Total")
+
+# Transaction journal written by excel_logger (SQL column → Transaction_Log header)
+JOURNAL_COLUMNS = {
+    "transaction_date": "Transaction Date",
+    "vehicle_reg": "Vehicle Reg. Number",
+    "chassis_number": "Chassis Number",
+    "owner_name": "Owner Name",
+    "payment_type": "Payment Type",
+    "rto_amount": "RTO Amount",
+    "bank_amount": "Bank Amount",
+    "otp": "OTP",
+    "employee_name": "Employee Name",
+    "gmail_id": "Gmail Message ID",
+    "raw_body": "Raw Email Body",
+}
+
+
+def parse_dates(values):
+    """Parse a whole column at once, trying each format only on the cells still unparsed (NaT if none fit)."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    text = values.astype("string").str.strip()
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for fmt in DATE_FORMATS:
+        pending = parsed.isna() & text.notna()
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(text[pending], format=fmt, errors="coerce")
+
+    # Cells that Excel already stored as real dates
+    is_datetime = values.map(lambda v: isinstance(v, datetime))
+    if is_datetime.any():
+        parsed[is_datetime] = pd.to_datetime(values[is_datetime])
+    return parsed
+
+
+def apply_types(df):
+    """
+    Give date and amount columns real dtypes where every value converts; a column with text that does
+    not (e.g. "NOT FOUND") is left as text so nothing is lost. Remaining mixed columns become strings.
+    """
+    df = df.copy()
+    for col in df.columns:
+        present = df[col].notna()
+        if col in DATE_COLUMNS:
+            converted = parse_dates(df[col])
+        elif col in AMOUNT_COLUMNS:
+            converted = pd.to_numeric(df[col], errors="coerce")
+        else:
+            converted = None
+
+        if converted is not None and converted[present].notna().all():
+            df[col] = converted
+        elif df[col].dtype == object:
+            # Parquet needs one type per column
+            df[col] = df[col].map(lambda v: v if v is None or isinstance(v, str) or pd.isna(v) else str(v))
+    return df
+
+
+def load_journal(journal_path, after_seq=0):
+    """Journal rows with seq > after_seq, as a DataFrame with the Transaction_Log headers plus 'seq'."""
+    select = ", ".join(f'{col} AS "{header}"' for col, header in JOURNAL_COLUMNS.items())
+    with sqlite3.connect(f"file:{journal_path}?mode=ro", uri=True) as conn:
+        df = pd.read_sql_query(
+            f"SELECT seq, {select} FROM transactions WHERE seq > ? ORDER BY seq", conn, params=(after_seq,)
+        )
+    return df
+
+
+def _kind(dtype):
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "date"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "number"
+    return "text"
+
+
+def _append(cached, new_rows):
+    """Cached rows plus newly read (untyped) rows, re-typing everything only if the new rows disagree."""
+    new_rows = apply_types(new_rows)
+    df = pd.concat([cached, new_rows], ignore_index=True)
+    if any(
+        _kind(cached[col].dtype) != _kind(new_rows[col].dtype)
+        for col in new_rows.columns if col in cached.columns
+    ):
+        df = apply_types(df)
+    return df
+
+
+def _stamp(path):
+    info = os.stat(path)
+    return [info.st_mtime_ns, info.st_size]
+
+
+def _cache_paths(source, sheet_name):
+    name = os.path.basename(str(source))
+    if sheet_name not in (None, 0):
+        name = f"{name}.{sheet_name}"
+    base = os.path.join(CACHE_DIR, name)
+    return f"{base}.parquet", f"{base}.json"
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(df, parquet_path, meta_path, meta):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{parquet_path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, parquet_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def _read_source(source, sheet_name):
+    source = str(source)
+    if source.endswith(".db"):
+        return load_journal(source).drop(columns=["seq"])
+    if source.endswith(".csv"):
+        return pd.read_csv(source)
+    return pd.read_excel(source, sheet_name=sheet_name or 0)
+
+
+def _journal_revision(conn):
+    # Bumped by the journal whenever rows are edited or deleted in place (e.g. from Sheets)
+    try:
+        found = conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(found[0]) if found else 0
+
+
+def _refresh_journal(source, cached, meta):
+    last_seq = meta.get("seq", 0) if cached is not None else 0
+    new_rows = load_journal(source, after_seq=last_seq)
+    with sqlite3.connect(f"file:{source}?mode=ro", uri=True) as conn:
+        total = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        revision = _journal_revision(conn)
+
+    if cached is not None and (len(cached) + len(new_rows) != total or meta.get("revision", 0) != revision):
+        # Journal was rebuilt, or rows were edited/deleted; start over
+        cached, new_rows = None, load_journal(source)
+    if cached is not None and new_rows.empty:
+        return cached, None
+
+    seq = int(new_rows["seq"].max()) if not new_rows.empty else last_seq
+    new_rows = new_rows.drop(columns=["seq"])
+    df = apply_types(new_rows) if cached is None else _append(cached, new_rows)
+    return df, {"seq": seq, "revision": revision}
+
+
+def _refresh_csv(source, cached, meta, stamp):
+    with open(source, "rb") as f:
+        header = f.readline().decode("utf-8")
+        size = meta.get("stamp", [0, 0])[1] if cached is not None else 0
+        appended = cached is not None and meta.get("header") == header and stamp[1] > size
+        if appended:
+            f.seek(size)
+            tail = f.read().decode("utf-8")
+
+    if appended:
+        df = _append(cached, pd.read_csv(io.StringIO(header + tail)))
+    else:
+        df = apply_types(pd.read_csv(source))
+    return df, {"stamp": stamp, "header": header}
+
+
+def load_dataset(source, sheet_name=0):
+    """
+    Load `source` (.xlsx, .csv or the .db transaction journal) through its Parquet mirror,
+    refreshing the mirror first if the source changed.
+    """
+    if not HAVE_PARQUET:
+        return apply_types(_read_source(source, sheet_name))
+
+    source = str(source)
+    parquet_path, meta_path = _cache_paths(source, sheet_name)
+    meta = _read_meta(meta_path) or {}
+    cached = pd.read_parquet(parquet_path) if meta and os.path.exists(parquet_path) else None
+
+    if source.endswith(".db"):
+        df, new_meta = _refresh_journal(source, cached, meta)
+    else:
+        stamp = _stamp(source)
+        if cached is not None and meta.get("stamp") == stamp:
+            return cached
+        if source.endswith(".csv"):
+            df, new_meta = _refresh_csv(source, cached, meta, stamp)
+        else:
+            df, new_meta = apply_types(_read_source(source, sheet_name)), {"stamp": stamp}
+
+    if new_meta is not None:
+        _write_cache(df, parquet_path, meta_path, new_meta)
+        print(f"🗃️ Refreshed columnar cache for '{source}' ({len(df)} rows)")
+    return df
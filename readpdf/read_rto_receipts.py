@@ -1,188 +1,388 @@
+import csv
+import hashlib
+import json
 import os
 import re
-import pandas as pd
+import sys
+import time
 from PyPDF2 import PdfReader
 from datetime import datetime
+from multiprocessing import Pool, TimeoutError
+
+# Stage timings are shared with the OTP utility (metrics.py in the repo root, standard library only)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import count_error, observe, span, write_metrics
 
 DEBUG = True  # Toggle debug logging
+FILE_TIMEOUT_SECONDS = 60  # Per-PDF limit so one malformed file cannot stall the batch
+
+LOG_FILE = "rto_receipts_log.csv"
+MANIFEST_FILE = "rto_receipts_manifest.json"  # content hash → file already logged (with each name's size/mtime)
+METRICS_FILE = "rto_receipts_metrics.prom"  # Prometheus text, rewritten after every batch
+
 
 # ─────────────────────────────────────────────
 # Utility Functions
 # ─────────────────────────────────────────────
 
+NON_ASCII = re.compile(r"[^\x00-\x7F]+")
+NEWLINES = re.compile(r"\n+")
+SPACES = re.compile(r"\s{2,}")
+
 def normalize_text(raw):
     text = raw.replace("\r", "\n").replace("\xa0", " ")
-    text = re.sub(r"[^\x00-\x7F]+", "", text)  # remove non-ASCII
-    text = re.sub(r"\n+", "\n", text)
-    text = re.sub(r"\s{2,}", " ", text)
+    text = NON_ASCII.sub("", text)  # remove non-ASCII
+    text = NEWLINES.sub("\n", text)
+    text = SPACES.sub(" ", text)
     return text.strip()
 
-def re_search(pattern, text, label):
-    match = re.search(pattern, text)
-    return match.group(1) if match else "NOT FOUND"
-
 # ─────────────────────────────────────────────
-# Format-Specific Parsers
+# Field Extractors
 # ─────────────────────────────────────────────
-def extract_vehicle_class(text):
+# Each helper returns an extractor: a function of (text, fields) → value, where `fields` holds the
+# values already extracted for the same receipt (so a field can reuse another instead of recomputing).
+
+def search(*patterns, default="NOT FOUND"):
+    """First capture group of the first pattern that matches."""
+    compiled = [re.compile(p) for p in patterns]
+    def extract(text, fields):
+        for regex in compiled:
+            match = regex.search(text)
+            if match:
+                return match.group(1)
+        return default
+    return extract
+
+def find_all(pattern, sep):
+    """Every match of the pattern, joined with `sep`."""
+    regex = re.compile(pattern)
+    return lambda text, fields: sep.join(regex.findall(text))
+
+def same_as(field_name):
+    """Reuse a field extracted earlier for the same receipt."""
+    return lambda text, fields: fields[field_name]
+
+VEHICLE_CLASS_LABEL = re.compile(r"Vehicle Class:\s*(.+)")
+KNOWN_VEHICLE_CLASSES = [
+    "Articulated Vehicle", "Goods Carrier", "Motor Cab", "Omni Bus",
+    "Trailer", "Three Wheeler", "Tractor", "Private Service Vehicle"
+]
+
+def extract_vehicle_class(text, fields=None):
     # Try labeled extraction first
-    match = re.search(r"Vehicle Class:\s*(.+)", text)
+    match = VEHICLE_CLASS_LABEL.search(text)
     if match:
         return match.group(1).strip()
-    
+
     # Fallback: scan for known class keywords
-    known_classes = [
-        "Articulated Vehicle", "Goods Carrier", "Motor Cab", "Omni Bus",
-        "Trailer", "Three Wheeler", "Tractor", "Private Service Vehicle"
-    ]
-    for cls in known_classes:
+    for cls in KNOWN_VEHICLE_CLASSES:
         if cls in text:
             return cls
     return "Vehicle Class → NOT FOUND"
 
-def parse_mv_tax(text):
-    return {
-        "Receipt No": " / ".join(re.findall(r"MH\d+V\d+|MH\d+C\d+", text)),
-        "GRN No": re_search(r"GRN No: (\d+)", text, "GRN No"),
-        "TIN": re_search(r"Transaction Identification Number\s+([\w]+)", text, "TIN"),
-        "Tax Period": " to ".join(re.findall(r"\d{2}-[A-Za-z]{3}-\d{4}", text)),
-        "Amount": re_search(r"GRAND TOTAL \(in Rs\):\s*(\d+)", text, "Amount"),
-        "Vehicle No": re_search(r"Vehicle No:\s*([A-Z0-9]+)", text, "Vehicle No"),
-        "Chassis No": re_search(r"Chasis No:\s*([A-Z0-9]+)", text, "Chassis No"),
-        "Vehicle Class": re_search(r"Vehicle Class:\s*(.*)", text, "Vehicle Class"),
-        "Transaction Date": re_search(r"Transaction Date:\s*(\d{2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2} (?:AM|PM))", text, "Transaction Date"),
-        "Bank Ref No": re_search(r"Bank Reference Number:\s*(\d+)", text, "Bank Ref No"),
-        "Vehicle Class": extract_vehicle_class(text),
-    }
-
-def extract_amount(text):
-    auth_block = re.search(r"Authorization Details:(.*?)(?:Transaction|Note:)", text, re.DOTALL)
+AUTH_BLOCK = re.compile(r"Authorization Details:(.*?)(?:Transaction|Note:)", re.DOTALL)
+AUTH_AMOUNT = re.compile(r"\d{2}-\d{2}-\d{4}\s+\d{2}-\d{2}-\d{4}\s+(\d{3,6})")
+
+def extract_amount(text, fields=None):
+    auth_block = AUTH_BLOCK.search(text)
     if auth_block:
-        block_text = auth_block.group(1)
-        match = re.search(r"\d{2}-\d{2}-\d{4}\s+\d{2}-\d{2}-\d{4}\s+(\d{3,6})", block_text)
+        match = AUTH_AMOUNT.search(auth_block.group(1))
         return match.group(1) if match else "Amount → NOT FOUND"
     return "Amount → NOT FOUND"
 
+CHASSIS_SAME_LINE = [re.compile(r"Chassis No:\s*([A-Z0-9]{10,17})"), re.compile(r"Chasis No:\s*([A-Z0-9]{10,17})")]
+CHASSIS_CANDIDATE = re.compile(r"[A-Z0-9]{10,17}")
 
-def parse_np_receipt(text):
-    return {
-        "Vehicle No": re_search(r"Regn\. No\.:\s*([A-Z0-9]+)", text, "Vehicle No"),
-        "Chassis No": re_search(r"Chassis No\.:\s*([A-Z0-9]+)", text, "Chassis No"),
-        "NP Auth No": re_search(r"NP Auth No:\s*([A-Z0-9\/]+)", text, "NP Auth No"),
-        "Permit Validity": " to ".join(re.findall(r"\d{2}-\d{2}-\d{4}", text)),
-        "Fee": re_search(r"Amount\s*\n\s*(\d{3,6})", text, "Fee"),
-        "Penalty": re_search(r"Penalty\s*\n\s*(\d{1,5})", text, "Penalty"),
-        "Amount": extract_amount(text),
-        "Grand Total": extract_amount(text),
-        "Fee": extract_amount(text),
-        "Receipt No": re_search(r"Transaction Id:\s*(\d+)", text, "Transaction ID"),
-        "Transaction Date": re_search(r"Transaction Date:\s*(\d{2}-\d{2}-\d{4} \d{2}:\d{2}:\d{2})", text, "Transaction Date"),
-        "Bank Ref No": re_search(r"Bank Ref No:\s*(\d+)", text, "Bank Ref No"),
-        "Vehicle Class": re_search(r"Vehicle Class:\s*(.+?)\s+Owner Name:", text, "Vehicle Class"),
-    }
-
-
-def parse_permit_renewal(text):
-    return {
-        "Receipt No": " / ".join(re.findall(r"MH\d+[PW]\d+", text)),
-        "Vehicle No": re_search(r"Vehicle No:\s*(MH\d{2}[A-Z]{2}\d{4})", text, "Vehicle No"),
-        "Chassis No": re_search(r"Chassis No:\s*([A-Z0-9]{17})", text, "Chassis No"),
-        "Fee": re_search(r"Total\s+(\d+\.\d+)", text, "Fee"),
-        "Penalty": re_search(r"Penalty\s+(\d+\.\d+)", text, "Penalty"),
-        "Grand Total": re_search(r"GRAND TOTAL \(in Rs\):\s*(\d+)", text, "Grand Total"),
-        "Tax Paid Upto": re_search(r"Tax Paid\s+Upto:\s*(\d{2}-[A-Za-z]{3}-\d{4})", text, "Tax Paid Upto"),
-        "Description": re_search(r"Description\s*[:\-]?\s*(.*)", text, "Description"),
-        "Transaction Date": re_search(r"Receipt Date:\s*(\d{2}-[A-Za-z]{3}-\d{4})", text, "Transaction Date"),
-        "Vehicle Class": re_search(r"Vehicle Class:\s*(.+?)\s+Owner Name:", text, "Vehicle Class"),
-    }
-
-def extract_chassis_number(text):
+def extract_chassis_number(text, fields=None):
     lines = text.splitlines()
     for i, line in enumerate(lines):
         if "Chassis No:" in line or "Chasis No:" in line:
             # Try extracting directly from the same line
-            match = re.search(r"Chassis No:\s*([A-Z0-9]{10,17})", line)
-            if not match:
-                match = re.search(r"Chasis No:\s*([A-Z0-9]{10,17})", line)
-            if match:
-                return match.group(1)
+            for regex in CHASSIS_SAME_LINE:
+                match = regex.search(line)
+                if match:
+                    return match.group(1)
             # If not found, look ahead up to 5 lines
             for j in range(i+1, min(i+6, len(lines))):
                 candidate = lines[j].strip()
-                if re.fullmatch(r"[A-Z0-9]{10,17}", candidate):
+                if CHASSIS_CANDIDATE.fullmatch(candidate):
                     return candidate
     return "Chassis No → NOT FOUND"
 
-def parse_new_registration(text):
-    fee_lines = re.findall(r"([A-Za-z /]+)\s+(\d+)\s+0\s+(\d+)", text)
+# ─────────────────────────────────────────────
+# Receipt Schema Registry
+# ─────────────────────────────────────────────
+# A receipt type is declared once: how to recognise it (file-name and text markers) and an
+# ordered list of (field name, extractor). Patterns are compiled when the schema is registered;
+# parsing normalizes the text once and runs each field's extractor exactly once, in order.
+# Adding a receipt type means calling register_schema, not writing a parser function.
+
+RECEIPT_SCHEMAS = []
+
+def register_schema(name, fields, filename_markers=(), text_markers=()):
+    RECEIPT_SCHEMAS.append({
+        "name": name,
+        "filename_markers": tuple(filename_markers),
+        "text_markers": tuple(text_markers),
+        "fields": list(fields),
+    })
 
-    # Try both transaction date formats
-    txn_date = re_search(r"Print on\s*(\d{2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2}:\d{2})", text, "Transaction Date")
-    if txn_date == "NOT FOUND":
-        txn_date = re_search(r"Printed On:\s*(\d{2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2}:\d{2})", text, "Transaction Date")
+register_schema(
+    "MV Tax Receipt",
+    filename_markers=["MV TAX"],
+    text_markers=["MV Tax"],
+    fields=[
+        ("Receipt No", find_all(r"MH\d+V\d+|MH\d+C\d+", " / ")),
+        ("GRN No", search(r"GRN No: (\d+)")),
+        ("TIN", search(r"Transaction Identification Number\s+([\w]+)")),
+        ("Tax Period", find_all(r"\d{2}-[A-Za-z]{3}-\d{4}", " to ")),
+        ("Amount", search(r"GRAND TOTAL \(in Rs\):\s*(\d+)")),
+        ("Vehicle No", search(r"Vehicle No:\s*([A-Z0-9]+)")),
+        ("Chassis No", search(r"Chasis No:\s*([A-Z0-9]+)")),
+        ("Vehicle Class", extract_vehicle_class),
+        ("Transaction Date", search(r"Transaction Date:\s*(\d{2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2} (?:AM|PM))")),
+        ("Bank Ref No", search(r"Bank Reference Number:\s*(\d+)")),
+    ],
+)
 
-    return {
-        "Receipt No": " / ".join(re.findall(r"MH\d+D\d+|MH\d+\d+", text)),
-        "Vehicle Registration Date": re_search(r"Vehicle Registration Date:\s*(\d{2}-\d{2}-\d{4})", text, "Vehicle Registration Date"),
-        "Grand Total": re_search(r"GRAND TOTAL \(in Rs\):\s*(\d+)", text, "Grand Total"),
-        "Chassis No": extract_chassis_number(text),
-        "Transaction Date": txn_date,
-        "Vehicle No": re_search(r"Vehicle No:\s*([A-Z0-9]+)", text, "Vehicle No"),
-        "Bank Ref No": re_search(r"Bank Reference\s*Number:\s*(\d{10})", text, "Bank Ref No"),
-        "Vehicle Class": re_search(r"Vehicle Class:\s*(.+?)\s+Owner Name:", text, "Vehicle Class"),
-    }
+register_schema(
+    "National Permit Receipt",
+    filename_markers=["NP"],
+    text_markers=["National Permit Composite Fee Payment Detail", "NP Auth No"],
+    fields=[
+        ("Vehicle No", search(r"Regn\. No\.:\s*([A-Z0-9]+)")),
+        ("Chassis No", search(r"Chassis No\.:\s*([A-Z0-9]+)")),
+        ("NP Auth No", search(r"NP Auth No:\s*([A-Z0-9\/]+)")),
+        ("Permit Validity", find_all(r"\d{2}-\d{2}-\d{4}", " to ")),
+        ("Penalty", search(r"Penalty\s*\n\s*(\d{1,5})")),
+        ("Amount", extract_amount),
+        ("Grand Total", same_as("Amount")),
+        ("Fee", same_as("Amount")),
+        ("Receipt No", search(r"Transaction Id:\s*(\d+)")),
+        ("Transaction Date", search(r"Transaction Date:\s*(\d{2}-\d{2}-\d{4} \d{2}:\d{2}:\d{2})")),
+        ("Bank Ref No", search(r"Bank Ref No:\s*(\d+)")),
+        ("Vehicle Class", search(r"Vehicle Class:\s*(.+?)\s+Owner Name:")),
+    ],
+)
 
+register_schema(
+    "Permit Renewal Receipt",
+    filename_markers=["PERMIT RENEWAL"],
+    text_markers=["Renewal of Permit Authorization"],
+    fields=[
+        ("Receipt No", find_all(r"MH\d+[PW]\d+", " / ")),
+        ("Vehicle No", search(r"Vehicle No:\s*(MH\d{2}[A-Z]{2}\d{4})")),
+        ("Chassis No", search(r"Chassis No:\s*([A-Z0-9]{17})")),
+        ("Fee", search(r"Total\s+(\d+\.\d+)")),
+        ("Penalty", search(r"Penalty\s+(\d+\.\d+)")),
+        ("Grand Total", search(r"GRAND TOTAL \(in Rs\):\s*(\d+)")),
+        ("Tax Paid Upto", search(r"Tax Paid\s+Upto:\s*(\d{2}-[A-Za-z]{3}-\d{4})")),
+        ("Description", search(r"Description\s*[:\-]?\s*(.*)")),
+        ("Transaction Date", search(r"Receipt Date:\s*(\d{2}-[A-Za-z]{3}-\d{4})")),
+        ("Vehicle Class", search(r"Vehicle Class:\s*(.+?)\s+Owner Name:")),
+    ],
+)
 
+register_schema(
+    "New Registration Receipt",
+    filename_markers=["NEW REGISTRATION"],
+    text_markers=["E-FEE", "Fitness Inspection"],
+    fields=[
+        ("Receipt No", find_all(r"MH\d+D\d+|MH\d+\d+", " / ")),
+        ("Vehicle Registration Date", search(r"Vehicle Registration Date:\s*(\d{2}-\d{2}-\d{4})")),
+        ("Grand Total", search(r"GRAND TOTAL \(in Rs\):\s*(\d+)")),
+        ("Chassis No", extract_chassis_number),
+        # Two print-date layouts are in circulation
+        ("Transaction Date", search(
+            r"Print on\s*(\d{2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2}:\d{2})",
+            r"Printed On:\s*(\d{2}-[A-Za-z]{3}-\d{4} \d{2}:\d{2}:\d{2})",
+        )),
+        ("Vehicle No", search(r"Vehicle No:\s*([A-Z0-9]+)")),
+        ("Bank Ref No", search(r"Bank Reference\s*Number:\s*(\d{10})")),
+        ("Vehicle Class", search(r"Vehicle Class:\s*(.+?)\s+Owner Name:")),
+    ],
+)
+
+def schema_fields():
+    """Every field name any registered schema produces, in first-seen order."""
+    names = []
+    for schema in RECEIPT_SCHEMAS:
+        for name, _ in schema["fields"]:
+            if name not in names:
+                names.append(name)
+    return names
 
 # ─────────────────────────────────────────────
 # Dispatcher & Logging
 # ─────────────────────────────────────────────
 
+def classify(text, filename):
+    # Schemas are tried in registration order; the first marker hit wins
+    fname = filename.upper()
+    for schema in RECEIPT_SCHEMAS:
+        if any(m in fname for m in schema["filename_markers"]) or any(m in text for m in schema["text_markers"]):
+            return schema
+    return None
+
+def extract_fields(schema, text):
+    fields = {}
+    for name, extract in schema["fields"]:
+        fields[name] = extract(text, fields)
+    return fields
+
 def classify_and_parse(text, filename):
     text = normalize_text(text)
-    fname = filename.upper()
-    if "MV TAX" in fname or "MV Tax" in text:
-        schema = "MV Tax Receipt"
-        data = parse_mv_tax(text)
-    elif "NP" in fname or "National Permit Composite Fee Payment Detail" in text or "NP Auth No" in text:
-        schema = "National Permit Receipt"
-        data = parse_np_receipt(text)
-    elif "PERMIT RENEWAL" in fname or "Renewal of Permit Authorization" in text:
-        schema = "Permit Renewal Receipt"
-        data = parse_permit_renewal(text)
-    elif "NEW REGISTRATION" in fname or "E-FEE" in text or "Fitness Inspection" in text:
-        schema = "New Registration Receipt"
-        data = parse_new_registration(text)
-    else:
-        schema = "Unknown Format"
-        data = {}
-    data["Schema"] = schema
+    schema = classify(text, filename)
+    data = extract_fields(schema, text) if schema else {}
+    data["Schema"] = schema["name"] if schema else "Unknown Format"
     data["File Name"] = filename
     return data
 
-def log_to_excel(data_list, output_file="rto_receipts_log.xlsx"):
-    df = pd.DataFrame(data_list)
-    df["Logged At"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    df["Missing Fields"] = df.apply(lambda row: [k for k, v in row.items() if v == "NOT FOUND"], axis=1)
-    if os.path.exists(output_file):
-        existing = pd.read_excel(output_file)
-        df = pd.concat([existing, df], ignore_index=True)
-    df.to_excel(output_file, index=False)
-
-def batch_process(folder_path):
-    all_data = []
-    for file in os.listdir(folder_path):
-        if file.lower().endswith(".pdf"):
-            try:
-                full_path = os.path.join(folder_path, file)
-                reader = PdfReader(full_path)
-                text = "\n".join(page.extract_text() for page in reader.pages if page.extract_text())
-                parsed = classify_and_parse(text, file)
-                all_data.append(parsed)
-                print(f"✅ Parsed: {file} as {parsed['Schema']}")
-            except Exception as e:
-                print(f"❌ Failed: {file} — {e}")
-    log_to_excel(all_data)
+def append_to_log(data_list, output_file=LOG_FILE):
+    """Append parsed receipts to the CSV log without reading back what is already there."""
+    if not data_list:
+        return
+
+    logged_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    is_new = not os.path.exists(output_file) or os.path.getsize(output_file) == 0
+    if is_new:
+        # Union of the fields every registered schema produces, plus bookkeeping columns
+        fieldnames = ["Schema", "File Name"] + schema_fields() + ["Logged At", "Missing Fields"]
+    else:
+        # Keep the column layout the file was started with; only its header line is read
+        with open(output_file, newline="", encoding="utf-8") as f:
+            fieldnames = next(csv.reader(f))
+
+    with open(output_file, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, restval="", extrasaction="ignore")
+        if is_new:
+            writer.writeheader()
+        for data in data_list:
+            writer.writerow({
+                **data,
+                "Logged At": logged_at,
+                "Missing Fields": str([k for k, v in data.items() if v == "NOT FOUND"]),
+            })
+
+def file_hash(full_path):
+    digest = hashlib.sha256()
+    with open(full_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_stat(full_path):
+    info = os.stat(full_path)
+    return [info.st_size, info.st_mtime_ns]
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, manifest_file=MANIFEST_FILE):
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_file, manifest_file)
+
+def extract_text(full_path):
+    reader = PdfReader(full_path)
+    # Extract each page once; empty pages are dropped
+    texts = (page.extract_text() for page in reader.pages)
+    return "\n".join(text for text in texts if text)
+
+def parse_pdf(full_path):
+    # Runs in a worker process; the duration is measured here and recorded by the parent
+    started = time.perf_counter()
+    data = classify_and_parse(extract_text(full_path), os.path.basename(full_path))
+    return time.perf_counter() - started, data
+
+def batch_process(folder_path, workers=None, timeout=FILE_TIMEOUT_SECONDS):
+    """
+    Parse every new PDF in the folder across a process pool. PDFs whose content hash is already in
+    the manifest are skipped; a file whose size and mtime match the manifest is not even re-hashed. Files that raise or exceed `timeout` seconds are reported and left
+    out of the manifest so the next run retries them. Results keep the sorted file-name order.
+    """
+    with span("receipt_batch"):
+        _batch_process(folder_path, workers, timeout)
+    write_metrics(METRICS_FILE)
+
+def _batch_process(folder_path, workers, timeout):
+    manifest = load_manifest()
+    known = {}  # file name → (size/mtime, content hash) as last recorded
+    for digest, entry in manifest.items():
+        for file, stat in entry.get("Files", {}).items():
+            known[file] = (stat, digest)
+
+    hashes, stats = {}, {}
+    with span("receipt_hash"):
+        for file in sorted(f for f in os.listdir(folder_path) if f.lower().endswith(".pdf")):
+            full_path = os.path.join(folder_path, file)
+            stat = file_stat(full_path)
+            seen = known.get(file)
+            if seen and seen[0] == stat:
+                continue
+            if seen:
+                # Changed since it was recorded; the old content no longer goes by this name
+                manifest[seen[1]]["Files"].pop(file, None)
+
+            digest = file_hash(full_path)
+            if digest in manifest:
+                # Same content as a receipt already logged (touched, renamed or copied)
+                manifest[digest].setdefault("Files", {})[file] = stat
+                continue
+            if digest in hashes.values():
+                continue
+            hashes[file], stats[file] = digest, stat
+    files = list(hashes)
+    print(f"🔎 {len(files)} new receipt(s) to parse, {len(manifest)} already processed")
+    workers = workers or os.cpu_count() or 1
+
+    results = {}
+
+    def keep(file, outcome):
+        seconds, results[file] = outcome
+        observe("receipt_parse", seconds)
+        print(f"✅ Parsed: {file} as {results[file]['Schema']}")
+
+    remaining = files
+    while remaining:
+        pool = Pool(processes=min(workers, len(remaining)))
+        try:
+            pending = [(file, pool.apply_async(parse_pdf, (os.path.join(folder_path, file),))) for file in remaining]
+            remaining = []
+            for i, (file, result) in enumerate(pending):
+                try:
+                    keep(file, result.get(timeout=timeout))
+                except TimeoutError:
+                    print(f"⏱️ Timed out: {file} (over {timeout}s)")
+                    count_error("receipt_parse")
+                    # The stuck worker keeps its slot, so queued files might never start: keep what
+                    # already finished and restart the pool for the rest
+                    for later_file, later_result in pending[i + 1:]:
+                        if later_result.ready() and later_result.successful():
+                            keep(later_file, later_result.get())
+                        else:
+                            remaining.append(later_file)
+                    break
+                except Exception as e:
+                    print(f"❌ Failed: {file} — {e}")
+                    count_error("receipt_parse")
+        finally:
+            # Kills any worker still stuck on a malformed PDF
+            pool.terminate()
+            pool.join()
+
+    all_data = [results[file] for file in files if file in results]
+    with span("receipt_log"):
+        append_to_log(all_data)
+
+        processed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for file in results:
+            manifest[hashes[file]] = {"File Name": file, "Processed At": processed_at, "Files": {file: stats[file]}}
+        save_manifest(manifest)
 
 # ─────────────────────────────────────────────
 # Entry Point
@@ -190,4 +390,4 @@ def batch_process(folder_path):
 
 if __name__ == "__main__":
     batch_process("rto_reciepts")
-    print("📂 Batch processing complete. Check rto_receipts_log.xlsx for results.")
+    print(f"📂 Batch processing complete. Check {LOG_FILE} for results.")
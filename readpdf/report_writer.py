@@ -0,0 +1,86 @@
+# report_writer.py
+
+import math
+import os
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from columnar_cache import HAVE_PARQUET
+
+# Formatted Excel reports written in a single streaming pass (write-only workbook): column widths
+# and the conditional highlight are declared up front, and every cell shares one font style, so
+# nothing has to be re-opened or touched cell by cell after the data is written.
+
+MIN_COLUMN_WIDTH = 12
+
+def column_width(header, values, min_width=MIN_COLUMN_WIDTH):
+    """Width that fits the longest header/value in the column (at least `min_width`)."""
+    lengths = values.dropna().astype(str).str.len()
+    longest = max(len(str(header)), int(lengths.max()) if len(lengths) else 0)
+    return max(longest + 2, min_width)
+
+def add_missing_highlight(ws, col_letter, last_row):
+    # Red fill and font on cells in the column that contain "missing"
+    red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+    red_font = Font(color="9C0006")
+    formula = f'ISNUMBER(SEARCH("missing",{col_letter}2))'
+    ws.conditional_formatting.add(
+        f"{col_letter}2:{col_letter}{last_row}",
+        FormulaRule(formula=[formula], fill=red_fill, font=red_font)
+    )
+
+def write_report(df, output_path, sheet_name="Sheet1", font_size=9, highlight_column=None):
+    """
+    Write `df` to `output_path` with a header row, font size `font_size` throughout, fitted column
+    widths, and (optionally) the "missing" highlight on `highlight_column`.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
+    font = Font(size=font_size)
+    columns = list(df.columns)
+
+    for position, name in enumerate(columns, start=1):
+        ws.column_dimensions[get_column_letter(position)].width = column_width(name, df[name])
+
+    if highlight_column in columns and len(df):
+        col_letter = get_column_letter(columns.index(highlight_column) + 1)
+        add_missing_highlight(ws, col_letter, len(df) + 1)
+
+    def styled(value):
+        # Empty cells for NaN/NaT/None, like DataFrame.to_excel
+        if value is pd.NaT or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+            value = None
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = font
+        return cell
+
+    ws.append([styled(str(name)) for name in columns])
+    # Row by row straight from the frame; no converted copy of the whole report
+    for row in df.itertuples(index=False, name=None):
+        ws.append([styled(value) for value in row])
+
+    wb.save(output_path)
+
+def export_frame(df, output_path, **report_options):
+    """
+    Write `df` as .csv, .parquet or a formatted .xlsx report, chosen by the file extension.
+    Without pyarrow a .parquet request is written as an .xlsx report next to it instead.
+    Returns the path actually written.
+    """
+    base, extension = os.path.splitext(str(output_path))
+    extension = extension.lower()
+    if extension == ".parquet" and not HAVE_PARQUET:
+        output_path = base + ".xlsx"
+        print(f"⚠️ pyarrow is not installed; writing '{output_path}' instead of Parquet")
+        extension = ".xlsx"
+
+    if extension == ".csv":
+        df.to_csv(output_path, index=False)
+    elif extension == ".parquet":
+        df.to_parquet(output_path, index=False)
+    else:
+        write_report(df, output_path, **report_options)
+    return output_path
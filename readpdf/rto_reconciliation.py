@@ -1,80 +1,136 @@
 # rto_reconciliation.py
 
+import argparse
+import os
+import sys
+import numpy as np
 import pandas as pd
-from datetime import datetime
-from openpyxl import load_workbook
-from openpyxl.styles import Font
-from openpyxl.utils import get_column_letter
-from openpyxl.formatting.rule import FormulaRule
-from openpyxl.styles import Font, PatternFill
-
-def apply_missing_highlight(ws):
-    # Find the column index for "Receipt from RTO Portal"
-    for col in ws.iter_cols(1, ws.max_column):
-        if col[0].value == "Receipt from RTO Portal":
-            rto_col_letter = col[0].column_letter
-            break
-    else:
-        return  # Column not found
-
-    # Define red fill and font
-    red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-    red_font = Font(color="9C0006")
-
-    # Apply conditional formatting rule
-    formula = f'ISNUMBER(SEARCH("missing",{rto_col_letter}2))'
-    ws.conditional_formatting.add(f"{rto_col_letter}2:{rto_col_letter}{ws.max_row}", FormulaRule(formula=[formula], fill=red_fill, font=red_font))
-
-def normalize_date(date_str):
-    # Try multiple formats, return only date part
-    for fmt in ("%d-%m-%Y", "%d-%b-%Y", "%d-%m-%Y %H:%M:%S", "%d-%b-%Y %I:%M %p"):
-        try:
-            return datetime.strptime(date_str, fmt).date()
-        except:
-            continue
-    return None
+from columnar_cache import load_dataset, parse_dates
+from report_writer import export_frame
+
+# config.json is read through the OTP utility's loader (config_loader.py in the repo root)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config_loader import load_config
+
+def normalize_dates(values):
+    """Calendar date of each cell (NaT where no known format fits)."""
+    return parse_dates(values).dt.normalize()
+
+# Transaction journal written by excel_logger
+JOURNAL_PATH = "transaction_journal.db"
 
 def load_data(otp_path, summary_path):
-    otp_df = pd.read_excel(otp_path)
-    summary_df = pd.read_excel(summary_path)
+    # Typed columnar copies, refreshed only when the sources change
+    otp_df = load_dataset(otp_path)
+    summary_df = load_dataset(summary_path)
     # Normalize dates
     
-    otp_df['Norm Date'] = otp_df['Transaction Date'].apply(normalize_date)
-    summary_df['Norm Date'] = summary_df['Transaction Date'].apply(normalize_date)
+    otp_df['Norm Date'] = normalize_dates(otp_df['Transaction Date'])
+    summary_df['Norm Date'] = normalize_dates(summary_df['Transaction Date'])
     return otp_df, summary_df
 
-def match_transactions(otp_df, summary_df):
-    results = []
-    for _, row in otp_df.iterrows():
-        matched_row = {}  # ✅ Always define this first
-
-        match1 = summary_df[
-            (summary_df['Vehicle No'] == row['Vehicle Reg. Number']) &
-            (summary_df['Amount'] == row['RTO Amount']) &
-            (summary_df['Norm Date'] == row['Norm Date'])
-        ]
-        match2 = summary_df[
-            (summary_df['Chassis No'] == row['Chassis Number']) &
-            (summary_df['Amount'] == row['RTO Amount']) &
-            (summary_df['Norm Date'] == row['Norm Date'])
-        ]
-
-        if not match1.empty:
-            status, scenario = "Matched", "Matched based on Vehicle No"
-            matched_row = match1.iloc[0].to_dict()
-        elif not match2.empty:
-            status, scenario = "Matched", "Matched based on Chassis No"
-            matched_row = match2.iloc[0].to_dict()
-        else:
-            status, scenario = "Missing", "None"
-
-        results.append({
-            **row.to_dict(), # original OTP row
-            "Receipt from RTO Portal": "Available" if status == "Matched" else "Missing",
-            "Match Scenario": scenario,
-            **matched_row           # adds summary columns if matched
-        })
-    return pd.DataFrame(results)
+# Matching tolerances: 0 / 0.0 means exact matching on date and amount. A one-day window catches
+# receipts stamped just after midnight; a small amount tolerance absorbs paise rounding.
+# Set them with "match_day_window" / "match_amount_tolerance" in config.json, or --day-window /
+# --amount-tolerance on the command line.
+MATCH_DAY_WINDOW = 0
+MATCH_AMOUNT_TOLERANCE = 0.0
+
+def match_settings():
+    """(day window, amount tolerance) from config.json, or the exact-match defaults without one."""
+    try:
+        config = load_config()
+    except (OSError, ValueError, KeyError, TypeError):
+        return MATCH_DAY_WINDOW, MATCH_AMOUNT_TOLERANCE
+    return (
+        int(config.get("match_day_window", MATCH_DAY_WINDOW)),
+        float(config.get("match_amount_tolerance", MATCH_AMOUNT_TOLERANCE))
+    )
+
+def _join_best(otp_keys, summary_keys, day_window, amount_tolerance):
+    """
+    Join OTP rows to summary rows on the key (vehicle or chassis number), keep the pairs whose amount
+    and date fall inside the tolerances, and pick the best-scoring receipt per OTP row (earliest
+    summary row on ties). Returns a DataFrame indexed by OTP row position with summary_pos and score.
+    """
+    left = otp_keys.dropna(subset=["key", "amount", "date"])
+    right = summary_keys.dropna(subset=["key", "amount", "date"])
+    pairs = left.merge(right, on="key", how="inner", suffixes=("_otp", "_summary"))
+
+    amount_gap = (pairs["amount_otp"] - pairs["amount_summary"]).abs()
+    day_gap = (pairs["date_otp"] - pairs["date_summary"]).abs().dt.days
+    pairs = pairs[(amount_gap <= amount_tolerance + 1e-9) & (day_gap <= day_window)]
+    amount_gap, day_gap = amount_gap[pairs.index], day_gap[pairs.index]
+
+    # 1.0 for an exact hit, down to 0.5 at the edge of both windows
+    pairs = pairs.assign(
+        score=1.0
+        - 0.25 * (amount_gap / amount_tolerance if amount_tolerance else 0.0)
+        - 0.25 * (day_gap / day_window if day_window else 0.0)
+    )
+    best = (
+        pairs.sort_values(["otp_pos", "score", "summary_pos"], ascending=[True, False, True])
+        .drop_duplicates(subset="otp_pos", keep="first")
+        .set_index("otp_pos")
+    )
+    return best[["summary_pos", "score"]]
+
+def _keys(df, key_col, amount_col, pos_name):
+    return pd.DataFrame({
+        pos_name: range(len(df)),
+        "key": df[key_col].to_numpy(),
+        "amount": pd.to_numeric(df[amount_col], errors="coerce").to_numpy(),
+        "date": pd.to_datetime(df["Norm Date"]).to_numpy(),
+    })
+
+def match_transactions(otp_df, summary_df, day_window=MATCH_DAY_WINDOW, amount_tolerance=MATCH_AMOUNT_TOLERANCE):
+    otp_df = otp_df.reset_index(drop=True)
+    summary_df = summary_df.reset_index(drop=True)
+
+    by_vehicle = _join_best(
+        _keys(otp_df, "Vehicle Reg. Number", "RTO Amount", "otp_pos"),
+        _keys(summary_df, "Vehicle No", "Amount", "summary_pos"),
+        day_window, amount_tolerance,
+    ).reindex(otp_df.index)
+    by_chassis = _join_best(
+        _keys(otp_df, "Chassis Number", "RTO Amount", "otp_pos"),
+        _keys(summary_df, "Chassis No", "Amount", "summary_pos"),
+        day_window, amount_tolerance,
+    ).reindex(otp_df.index)
+
+    # Vehicle number takes precedence; chassis number only fills the gaps
+    vehicle_hit = by_vehicle["summary_pos"].notna()
+    chassis_hit = ~vehicle_hit & by_chassis["summary_pos"].notna()
+    summary_pos = by_vehicle["summary_pos"].fillna(by_chassis["summary_pos"])
+    score = by_vehicle["score"].fillna(by_chassis["score"]).fillna(0.0).round(3)
+    matched = summary_pos.notna()
+    approximate = matched & (score < 1.0)
+
+    result = otp_df.copy()
+    result["Receipt from RTO Portal"] = np.where(matched, "Available", "Missing")
+    result["Match Scenario"] = np.select(
+        [vehicle_hit & approximate, vehicle_hit, chassis_hit & approximate, chassis_hit],
+        [
+            "Matched based on Vehicle No (within tolerance)",
+            "Matched based on Vehicle No",
+            "Matched based on Chassis No (within tolerance)",
+            "Matched based on Chassis No",
+        ],
+        default="None",
+    )
+    result["Match Score"] = score
+
+    if matched.any():
+        # Summary columns overwrite same-named OTP columns on matched rows only
+        matched_rows = summary_df.iloc[summary_pos[matched].astype(int).to_numpy()]
+        matched_rows.index = result.index[matched]
+        for col in summary_df.columns:
+            if col in result.columns:
+                result[col] = result[col].astype(object)
+                result.loc[matched, col] = matched_rows[col].astype(object)
+            else:
+                result[col] = matched_rows[col]
+    return result
 
 def save_results(df, output_path):
     # Drop 'Norm Date' if present
@@ -82,34 +138,23 @@ def save_results(df, output_path):
         df = df.drop(columns=['Norm Date'])
 
     # Reorder columns
-    priority = ['Receipt from RTO Portal', 'Match Scenario']
+    priority = ['Receipt from RTO Portal', 'Match Scenario', 'Match Score']
     cols = df.columns.tolist()
     reordered = priority + [col for col in cols if col not in priority]
     df = df[reordered]
 
-    # Save to Excel
-    df.to_excel(output_path, index=False)
-
-    # Apply formatting
-    wb = load_workbook(output_path)
-    ws = wb.active
-
-    # Set font size to 9 for all cells
-    for row in ws.iter_rows():
-        for cell in row:
-            cell.font = Font(size=9)
-
-    # Auto-adjust column widths
-    for col in ws.columns:
-        max_length = max(len(str(cell.value)) if cell.value else 0 for cell in col)
-        col_letter = get_column_letter(col[0].column)
-        ws.column_dimensions[col_letter].width = max(max_length + 2, 12)
-
-    apply_missing_highlight(ws)    
-    
-    wb.save(output_path)
+    # Save as a formatted Excel report (or CSV/Parquet, by extension)
+    export_frame(df, output_path, highlight_column="Receipt from RTO Portal")
 
 # Main execution
-otp_df, summary_df = load_data("OTP_transaction_list.xlsx", "summary.xlsx")
-result_df = match_transactions(otp_df, summary_df)
-save_results(result_df, "reconciliation_result.xlsx")
+if __name__ == "__main__":
+    day_window, amount_tolerance = match_settings()
+    parser = argparse.ArgumentParser(description="Match logged OTP transactions to RTO receipts.")
+    parser.add_argument("--day-window", type=int, default=day_window, help=f"days apart a match may be (default: {day_window})")
+    parser.add_argument("--amount-tolerance", type=float, default=amount_tolerance, help=f"rupees apart a match may be (default: {amount_tolerance})")
+    args = parser.parse_args()
+
+    otp_source = JOURNAL_PATH if os.path.exists(JOURNAL_PATH) else "OTP_transaction_list.xlsx"
+    otp_df, summary_df = load_data(otp_source, "summary.xlsx")
+    result_df = match_transactions(otp_df, summary_df, day_window=args.day_window, amount_tolerance=args.amount_tolerance)
+    save_results(result_df, "reconciliation_result.xlsx")
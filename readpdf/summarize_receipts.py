@@ -1,7 +1,7 @@
+import os
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import Font
-from openpyxl.utils import get_column_letter
+from columnar_cache import apply_types, load_dataset
+from report_writer import export_frame
 
 def summarize_log_to_sheet(df, output_path="summary.xlsx", sheet_name="Summary"):
     """
@@ -32,33 +32,23 @@ def summarize_log_to_sheet(df, output_path="summary.xlsx", sheet_name="Summary")
     summary_df["Amount"] = pd.to_numeric(summary_df["Amount"], errors="coerce")
     # summary_df["Bank Ref No"] = pd.to_numeric(summary_df["Bank Ref No"], errors="coerce")
     
-    # 📤 Save to Excel
-    with pd.ExcelWriter(output_path, engine="openpyxl", mode="w") as writer:
-        summary_df.to_excel(writer, index=False, sheet_name=sheet_name)
+    # 📤 Save to Excel (font and column widths applied while writing), or CSV/Parquet by extension
+    output_path = export_frame(summary_df, output_path, sheet_name=sheet_name)
     
     print(f"✅ Summary saved to '{output_path}'")
 
-    # Apply formatting
-    wb = load_workbook(output_path)
-    ws = wb.active
 
-    # Set font size to 9 for all cells
-    for row in ws.iter_rows():
-        for cell in row:
-            cell.font = Font(size=9)
-
-    # Auto-adjust column widths
-    for col in ws.columns:
-        max_length = max(len(str(cell.value)) if cell.value else 0 for cell in col)
-        col_letter = get_column_letter(col[0].column)
-        ws.column_dimensions[col_letter].width = max(max_length + 2, 12)
-
-    # 💾 Save formatted workbook
-    wb.save(output_path)
-
-
-# Load the full log Excel file
-full_log_df = pd.read_excel("rto_receipts_log.xlsx")
+# Load the full receipts log: the append-only CSV plus whatever older runs wrote to the Excel log.
+# A receipt logged more than once (in both logs after the switch to CSV, or twice in the CSV after a
+# retry) is kept once, from its latest entry.
+log_sources = [name for name in ("rto_receipts_log.xlsx", "rto_receipts_log.csv") if os.path.exists(name)]
+if not log_sources:
+    raise FileNotFoundError("No receipts log found (rto_receipts_log.csv or rto_receipts_log.xlsx)")
+full_log_df = pd.concat([load_dataset(name) for name in log_sources], ignore_index=True)
+full_log_df = full_log_df.drop_duplicates(subset=["File Name"], keep="last", ignore_index=True)
+if len(log_sources) > 1:
+    # Columns typed separately per log may disagree
+    full_log_df = apply_types(full_log_df)
 
 # Run the summary function
 summarize_log_to_sheet(full_log_df)
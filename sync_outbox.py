@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from config_loader import load_config
+from logger import setup_logger
+from metrics import count_error, span
+from sync_to_google import push_to_google_sheet
+from transaction_journal import JOURNAL_PATH
+
+logger = setup_logger(name="sync_outbox")
+config = load_config()
+
+# ─────────────────────────────────────────────
+# Durable sync outbox
+# ─────────────────────────────────────────────
+# Every change that needs to reach Google Sheets drops a row in `sync_outbox` (same SQLite file
+# as the transaction journal, so it survives restarts). The outbox has its own connection, so its
+# statements never land inside one of the journal's transactions. A background worker waits for a short
+# quiet period so bursts of OTPs coalesce into one push, uploads, and only then clears the rows
+# it covered. Failed pushes are retried with exponential backoff.
+
+COALESCE_SECONDS = config.get("sync_coalesce_seconds", 5)
+COALESCE_MAX_SECONDS = 30  # Never hold a steady stream of changes back longer than this
+RETRY_MIN_SECONDS = 10
+RETRY_MAX_SECONDS = 600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    reason TEXT
+);
+"""
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_drain_lock = threading.Lock()  # One push at a time (worker vs. the final drain on exit)
+_worker = None
+_worker_lock = threading.Lock()
+_conn = None
+
+
+def _connection():
+    # Caller must hold _lock
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(str(JOURNAL_PATH), check_same_thread=False, isolation_level=None, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(_SCHEMA)
+    return _conn
+
+
+def enqueue_sync(reason=""):
+    """Record that the Sheets copy is out of date and nudge the uploader."""
+    with _lock:
+        _connection().execute(
+            "INSERT INTO sync_outbox (created_at, reason) VALUES (?, ?)",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), reason)
+        )
+    _wake.set()
+
+
+def pending_count():
+    with _lock:
+        return _connection().execute("SELECT COUNT(*) FROM sync_outbox").fetchone()[0]
+
+
+def drain_outbox():
+    """Push once if anything is pending. Returns True when the outbox is empty afterwards."""
+    with _drain_lock:
+        return _drain()
+
+
+def _drain():
+    with _lock:
+        found = _connection().execute("SELECT COUNT(*), MAX(id) FROM sync_outbox").fetchone()
+    count, high_water = found
+    if not count:
+        return True
+
+    logger.info(f"📤 Pushing to Google Sheets for {count} pending change(s)")
+    with span("sheets_push"):
+        pushed = push_to_google_sheet()
+    if not pushed:
+        count_error("sheets_push")
+        return False
+
+    # Only clear what this push covered; anything queued meanwhile goes out on the next round
+    with _lock:
+        _connection().execute("DELETE FROM sync_outbox WHERE id <= ?", (high_water,))
+        remaining = _connection().execute("SELECT COUNT(*) FROM sync_outbox").fetchone()[0]
+    return remaining == 0
+
+
+def _run():
+    retry_delay = RETRY_MIN_SECONDS
+    while True:
+        if not pending_count():
+            _wake.wait()
+        _wake.clear()
+
+        # Let a burst of OTPs settle into a single upload
+        started = time.monotonic()
+        while time.monotonic() - started < COALESCE_MAX_SECONDS and _wake.wait(COALESCE_SECONDS):
+            _wake.clear()
+
+        try:
+            ok = drain_outbox()
+        except Exception as e:
+            logger.error(f"❌ Outbox drain failed: {e}")
+            ok = False
+
+        if ok:
+            retry_delay = RETRY_MIN_SECONDS
+        elif pending_count():
+            logger.warning(f"⚠️ Sheets push failed; retrying in {retry_delay}s")
+            time.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, RETRY_MAX_SECONDS)
+
+
+def start_uploader():
+    """Start the background uploader; changes left over from a previous run are pushed first."""
+    global _worker
+    # main's startup thread and the headless service may both call this
+    with _worker_lock:
+        if _worker is not None:
+            return
+        _worker = threading.Thread(target=_run, name="sync-outbox", daemon=True)
+        _worker.start()
+    leftover = pending_count()
+    if leftover:
+        logger.info(f"🔁 {leftover} unsynced change(s) from a previous run")
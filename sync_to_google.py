@@ -1,21 +1,19 @@
-import gspread
 import json
-from openpyxl import load_workbook
+import time
 from pathlib import Path
-from oauth2client.service_account import ServiceAccountCredentials
+from config_loader import load_config
+from google_clients import get_gspread_client
 from logger import setup_logger
+from workbook_cache import read_tab, tab_row_count
+from transaction_journal import (
+    HEADERS, JOURNAL_TAB, bootstrap_from_excel, iter_rows, last_seq, mark_in_sheet, revision, row_count, stream_rows
+)
 
 # Initialize logger
 logger = setup_logger(name="sheets_sync")
 
 # 🔧 Load configuration
-CONFIG_PATH = Path("config.json")
-if not CONFIG_PATH.exists():
-    logger.error(f"❌ config.json not found at: {CONFIG_PATH.resolve()}")
-    raise FileNotFoundError("Missing config.json")
-
-with open(CONFIG_PATH, "r") as f:
-    config = json.load(f)
+config = load_config()
 
 # Configurable paths
 CREDENTIALS_PATH = Path(config["sheets_credentials_path"])
@@ -28,60 +26,349 @@ TAB_MAPPING = config.get("tab_mapping", {})
 def normalize(text):
     return str(text).strip().replace("\n", " ").replace("\r", "")
 
-def push_tab(excel_tab, sheet_tab):
-    try:
-        # Authenticate
-        creds = ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_PATH, [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/drive"
-        ])
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key(SHEET_ID)
-
-        # Load Excel workbook
-        wb = load_workbook(MASTER_SHEET_PATH, data_only=True)
-        if excel_tab not in wb.sheetnames:
+def quote_tab(sheet_tab):
+    # A1 notation: tab names are single-quoted, embedded quotes doubled
+    return "'" + sheet_tab.replace("'", "''") + "'"
+
+def value_input_option(excel_tab):
+    # The journal tab must come back exactly as written (OTP leading zeros, Entry IDs, date text)
+    return "RAW" if excel_tab == JOURNAL_TAB else "USER_ENTERED"
+
+# Collect the header and non-empty rows for one tab
+def read_tab_rows(excel_tab):
+    if excel_tab == JOURNAL_TAB:
+        # Transaction log rows come straight from the journal, not the exported xlsx
+        bootstrap_from_excel(MASTER_SHEET_PATH)
+        excel_headers = list(HEADERS)
+        source_rows = iter_rows()
+    else:
+        # Snapshot from the shared workbook cache
+        tab_rows = read_tab(MASTER_SHEET_PATH, excel_tab)
+        if not tab_rows:
             logger.warning(f"⚠️ Excel tab '{excel_tab}' not found in workbook. Skipping sync.")
-            return
+            return None
+
+        excel_headers = [normalize(value) for value in tab_rows[0]]
+        source_rows = tab_rows[1:]
+    logger.debug(f"🔍 Headers from '{excel_tab}': {excel_headers}")
+
+    rows = []
+    for i, row in enumerate(source_rows, start=2):
+        cleaned_row = [str(cell).strip() if cell is not None else "" for cell in row]
+        if any(cleaned_row):
+            rows.append(cleaned_row)
+        else:
+            logger.debug(f"⏭️ Skipped empty row {i} in '{excel_tab}'")
+    return excel_headers, rows
+
+def push_tabs(tab_mapping):
+    """
+    Push several Excel tabs in one cycle: tabs come from the shared workbook cache, one client is used,
+    and all tabs are cleared with a single batchClear and written with one batchUpdate per value input
+    option (the journal tab goes up RAW, the rest USER_ENTERED).
+    Returns True when the push went through (or there was nothing to push), False on failure.
+    """
+    try:
+        # Journal rows up to here are in this push; anything logged while it runs goes next time
+        journal_seq = last_seq() if JOURNAL_TAB in tab_mapping else None
+        payload = {}
+        for excel_tab, sheet_tab in tab_mapping.items():
+            tab_rows = read_tab_rows(excel_tab)
+            if tab_rows is not None:
+                payload[sheet_tab] = (excel_tab, *tab_rows)
+
+        if not payload:
+            return True
+
+        if config.get("dry_run"):
+            for sheet_tab, (excel_tab, _, rows) in payload.items():
+                logger.info(f"🧪 Dry run: would sync {len(rows)} rows to '{sheet_tab}' from '{excel_tab}'")
+            return True
+
+        spreadsheet = get_gspread_client().open_by_key(SHEET_ID)
 
-        ws = wb[excel_tab]
-        excel_headers = [normalize(cell.value) for cell in ws[1]]
-        logger.debug(f"🔍 Headers from '{excel_tab}': {excel_headers}")
+        # Ensure tabs exist and are tall/wide enough for the values we are about to write
+        worksheets = {ws.title: ws for ws in spreadsheet.worksheets()}
+        resize_requests = []
+        for sheet_tab, (_, excel_headers, rows) in payload.items():
+            needed_rows = len(rows) + 1
+            needed_cols = max([len(excel_headers)] + [len(row) for row in rows])
+            sheet = worksheets.get(sheet_tab)
+            if sheet is None:
+                logger.warning(f"⚠️ Tab '{sheet_tab}' not found. Creating new worksheet...")
+                sheet = spreadsheet.add_worksheet(
+                    title=sheet_tab, rows=str(max(needed_rows, 1000)), cols=str(max(needed_cols, 50))
+                )
+                logger.info(f"✅ Created new tab: '{sheet_tab}'")
+            elif sheet.row_count < needed_rows or sheet.col_count < needed_cols:
+                resize_requests.append({
+                    "updateSheetProperties": {
+                        "properties": {
+                            "sheetId": sheet.id,
+                            "gridProperties": {
+                                "rowCount": max(sheet.row_count, needed_rows),
+                                "columnCount": max(sheet.col_count, needed_cols)
+                            }
+                        },
+                        "fields": "gridProperties(rowCount,columnCount)"
+                    }
+                })
+        if resize_requests:
+            spreadsheet.batch_update({"requests": resize_requests})
 
-        rows = []
-        for i, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-            cleaned_row = [str(cell).strip() if cell is not None else "" for cell in row]
-            if any(cleaned_row):
-                rows.append(cleaned_row)
+        ranges = [quote_tab(sheet_tab) for sheet_tab in payload]
+        spreadsheet.values_batch_clear(body={"ranges": ranges})
+        for input_option in ("USER_ENTERED", "RAW"):
+            data = [
+                {"range": f"{quote_tab(sheet_tab)}!A1", "values": [excel_headers] + rows}
+                for sheet_tab, (excel_tab, excel_headers, rows) in payload.items()
+                if value_input_option(excel_tab) == input_option
+            ]
+            if data:
+                spreadsheet.values_batch_update(body={"valueInputOption": input_option, "data": data})
+
+        if any(excel_tab == JOURNAL_TAB for excel_tab, _, _ in payload.values()):
+            mark_in_sheet(journal_seq)
+
+        # Sheets now holds exactly what was pushed; the next pull skips these tabs unless they are
+        # edited there (imported here, downsync imports this module)
+        from downsync_from_google import hash_rows, update_downsync_state
+        update_downsync_state({
+            sheet_tab: hash_rows([excel_headers] + rows) for sheet_tab, (_, excel_headers, rows) in payload.items()
+        })
+
+        for sheet_tab, (excel_tab, _, rows) in payload.items():
+            if rows:
+                logger.info(f"✅ Synced {len(rows)} rows to '{sheet_tab}' from '{excel_tab}'")
             else:
-                logger.debug(f"⏭️ Skipped empty row {i} in '{excel_tab}'")
+                logger.info(f"ℹ️ No non-empty rows to sync for '{excel_tab}'")
+
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Sync failed for {', '.join(tab_mapping)}: {e}")
+        return False
+
+# ─────────────────────────────────────────────
+# Streaming upload for very large tabs
+# ─────────────────────────────────────────────
+# Rows are read lazily (SQLite cursor for the journal, openpyxl's read-only iterator for xlsx tabs)
+# and written in fixed-size chunks with a minimum gap between requests to stay inside the Sheets
+# write quota. Progress is saved after every chunk, so a failed upload resumes from the first
+# unwritten chunk as long as the source has not changed since.
+
+STREAM_THRESHOLD_ROWS = config.get("sheets_stream_threshold_rows", 5000)
+CHUNK_ROWS = config.get("sheets_chunk_rows", 2000)
+MIN_REQUEST_INTERVAL = config.get("sheets_min_request_interval", 1.0)
+QUOTA_RETRIES = 5
+UPLOAD_PROGRESS_PATH = Path("upload_progress.json")
+
+_last_request_at = 0.0
+
+def _paced(call, *args, **kwargs):
+    """Run one Sheets request, keeping MIN_REQUEST_INTERVAL between requests and backing off on 429s."""
+    global _last_request_at
+    from gspread.exceptions import APIError
+
+    delay = MIN_REQUEST_INTERVAL
+    for attempt in range(QUOTA_RETRIES + 1):
+        wait = _last_request_at + MIN_REQUEST_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request_at = time.monotonic()
+        try:
+            return call(*args, **kwargs)
+        except APIError as e:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if status != 429 or attempt == QUOTA_RETRIES:
+                raise
+            logger.warning(f"⏳ Sheets quota hit; backing off {delay:.0f}s")
+            time.sleep(delay)
+            delay *= 2
+
+def _load_progress():
+    if not UPLOAD_PROGRESS_PATH.exists():
+        return {}
+    try:
+        with open(UPLOAD_PROGRESS_PATH, "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_progress(progress):
+    with open(UPLOAD_PROGRESS_PATH, "w") as f:
+        json.dump(progress, f, indent=2)
+
+def upload_in_progress(sheet_tab):
+    """True while a streamed upload of `sheet_tab` is unfinished (the tab holds only part of it)."""
+    return sheet_tab in _load_progress()
+
+def _source_signature(excel_tab):
+    if excel_tab == JOURNAL_TAB:
+        # journal:<last seq>:<revision>; the revision moves when rows are edited or deleted in place
+        return f"journal:{last_seq()}:{revision()}"
+    stat = MASTER_SHEET_PATH.stat()
+    return f"xlsx:{stat.st_mtime_ns}:{stat.st_size}"
+
+def _can_resume(saved, current):
+    if saved == current:
+        return True
+    # Appends keep an upload of an older journal snapshot a valid prefix of the new one; edits and
+    # deletes (merged from Sheets) shift rows, so a changed revision means starting over
+    if not (saved.startswith("journal:") and current.startswith("journal:")):
+        return False
+    saved_parts, current_parts = saved.split(":"), current.split(":")
+    return (
+        len(saved_parts) == 3 and saved_parts[2] == current_parts[2]
+        and int(saved_parts[1]) <= int(current_parts[1])
+    )
+
+def _stream_source(excel_tab, signature):
+    """Yield (headers, row iterator) for a tab without materializing it."""
+    if excel_tab == JOURNAL_TAB:
+        up_to_seq = int(signature.split(":")[1])
+        return list(HEADERS), stream_rows(up_to_seq=up_to_seq)
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(MASTER_SHEET_PATH, read_only=True, data_only=True)
+    if excel_tab not in wb.sheetnames:
+        wb.close()
+        return None
+
+    def rows():
+        try:
+            yield from wb[excel_tab].iter_rows(min_row=2, values_only=True)
+        finally:
+            wb.close()
+
+    header = next(wb[excel_tab].iter_rows(min_row=1, max_row=1, values_only=True), ())
+    return [normalize(value) for value in header], rows()
+
+def _chunks(source_rows, size, skip=0):
+    # Non-empty rows only; the first `skip` of them were uploaded by an earlier attempt
+    chunk = []
+    for row in source_rows:
+        cleaned_row = [str(cell).strip() if cell is not None else "" for cell in row]
+        if not any(cleaned_row):
+            continue
+        if skip:
+            skip -= 1
+            continue
+        chunk.append(cleaned_row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def push_tab_streaming(excel_tab, sheet_tab, chunk_rows=CHUNK_ROWS):
+    """Upload one tab in chunks with bounded memory. Returns True when the whole tab is uploaded."""
+    try:
+        if excel_tab == JOURNAL_TAB:
+            bootstrap_from_excel(MASTER_SHEET_PATH)
+        signature = _source_signature(excel_tab)
+        source = _stream_source(excel_tab, signature)
+        if source is None:
+            logger.warning(f"⚠️ Excel tab '{excel_tab}' not found in workbook. Skipping sync.")
+            return True
+        excel_headers, source_rows = source
 
         if config.get("dry_run"):
-            logger.info(f"🧪 Dry run: would sync {len(rows)} rows to '{sheet_tab}' from '{excel_tab}'")
-            return
+            logger.info(f"🧪 Dry run: would stream '{excel_tab}' to '{sheet_tab}' in chunks of {chunk_rows}")
+            return True
 
-        # Ensure tab exists
+        from gspread.exceptions import WorksheetNotFound
+
+        spreadsheet = get_gspread_client().open_by_key(SHEET_ID)
         try:
             sheet = spreadsheet.worksheet(sheet_tab)
-        except gspread.exceptions.WorksheetNotFound:
+        except WorksheetNotFound:
             logger.warning(f"⚠️ Tab '{sheet_tab}' not found. Creating new worksheet...")
-            sheet = spreadsheet.add_worksheet(title=sheet_tab, rows="1000", cols="50")
-            logger.info(f"✅ Created new tab: '{sheet_tab}'")
-
-        sheet.clear()
-        sheet.append_row(excel_headers)
-        if rows:
-            sheet.append_rows(rows, value_input_option="USER_ENTERED")
-            logger.info(f"✅ Synced {len(rows)} rows to '{sheet_tab}' from '{excel_tab}'")
+            sheet = _paced(spreadsheet.add_worksheet, title=sheet_tab, rows="1000", cols="50")
+
+        from downsync_from_google import RowDigest, update_downsync_state
+
+        progress = _load_progress()
+        tab_progress = progress.get(sheet_tab)
+        if tab_progress and _can_resume(tab_progress.get("signature", ""), signature):
+            done = tab_progress["rows_done"]
+            progress[sheet_tab]["signature"] = signature
+            # Rows uploaded by the earlier attempt are not hashed here; the next pull re-reads the tab
+            digest = None
+            logger.info(f"↩️ Resuming upload of '{sheet_tab}' after {done} rows")
         else:
-            logger.info(f"ℹ️ No non-empty rows to sync for '{excel_tab}'")
+            done = 0
+            digest = RowDigest()
+            digest.add(excel_headers)
+            _paced(spreadsheet.values_clear, quote_tab(sheet_tab))
+            _paced(
+                spreadsheet.values_update, f"{quote_tab(sheet_tab)}!A1",
+                params={"valueInputOption": value_input_option(excel_tab)}, body={"values": [excel_headers]}
+            )
+            progress[sheet_tab] = {"signature": signature, "rows_done": 0}
+            _save_progress(progress)
+
+        row_capacity = sheet.row_count
+        for chunk in _chunks(source_rows, chunk_rows, skip=done):
+            start_row = done + 2
+            end_row = start_row + len(chunk) - 1
+            if end_row > row_capacity:
+                grow = max(end_row - row_capacity, row_capacity)
+                _paced(sheet.add_rows, grow)
+                row_capacity += grow
+
+            _paced(
+                spreadsheet.values_update, f"{quote_tab(sheet_tab)}!A{start_row}",
+                params={"valueInputOption": value_input_option(excel_tab)}, body={"values": chunk}
+            )
+            if digest is not None:
+                for row in chunk:
+                    digest.add(row)
+            done += len(chunk)
+            progress[sheet_tab]["rows_done"] = done
+            _save_progress(progress)
+            logger.info(f"📦 Uploaded rows {start_row}-{end_row} of '{sheet_tab}'")
+
+        progress.pop(sheet_tab, None)
+        _save_progress(progress)
+        if excel_tab == JOURNAL_TAB:
+            mark_in_sheet(int(signature.split(":")[1]))
+        update_downsync_state({sheet_tab: digest.hexdigest() if digest is not None else None})
+        logger.info(f"✅ Streamed {done} rows to '{sheet_tab}' from '{excel_tab}'")
+        return True
 
     except Exception as e:
-        logger.error(f"❌ Sync failed for '{excel_tab}': {e}")
+        logger.error(f"❌ Streaming sync failed for '{excel_tab}' (will resume from last chunk): {e}")
+        return False
+
+def _tab_size(excel_tab):
+    if excel_tab == JOURNAL_TAB:
+        return row_count()
+    return tab_row_count(MASTER_SHEET_PATH, excel_tab)
+
+def push_tab(excel_tab, sheet_tab):
+    if _tab_size(excel_tab) > STREAM_THRESHOLD_ROWS:
+        return push_tab_streaming(excel_tab, sheet_tab)
+    return push_tabs({excel_tab: sheet_tab})
 
 def push_to_google_sheet():
-    for excel_tab, sheet_tab in TAB_MAPPING.items():
-        push_tab(excel_tab, sheet_tab)
+    # The push replaces the whole journal tab: merge what other desktops (or people editing the
+    # sheet) put there first, so this push does not wipe it out
+    if JOURNAL_TAB in TAB_MAPPING and not config.get("dry_run"):
+        from downsync_from_google import pull_journal_tab
+        if not pull_journal_tab():
+            logger.warning("⚠️ Could not merge the Sheets journal tab first; skipping this push")
+            return False
+
+    # Small tabs share one batched cycle; very large ones are streamed in chunks
+    large = {e: s for e, s in TAB_MAPPING.items() if _tab_size(e) > STREAM_THRESHOLD_ROWS}
+    small = {e: s for e, s in TAB_MAPPING.items() if e not in large}
+
+    ok = push_tabs(small) if small else True
+    for excel_tab, sheet_tab in large.items():
+        ok = push_tab_streaming(excel_tab, sheet_tab) and ok
+    return ok
 
 if __name__ == "__main__":
     push_to_google_sheet()
@@ -0,0 +1,225 @@
+import base64
+import random
+import string
+from datetime import datetime, timedelta
+
+from transaction_journal import HEADERS, JOURNAL_TAB
+
+# ─────────────────────────────────────────────
+# Synthetic data for benchmarks
+# ─────────────────────────────────────────────
+# Generators are deterministic for a given seed, so runs of different versions see the same data.
+
+PAYMENT_TYPES = ["MV Tax", "Permit Renewal", "National Permit", "New Registration", "Fitness"]
+OWNERS = ["Sharma Logistics", "Patil Transport", "Deshmukh Roadways", "Kulkarni Carriers", "Shaikh Travels"]
+EMPLOYEES = ["Amit", "Priya", "Rahul", "Sneha"]
+VEHICLE_CLASSES = ["Goods Carrier", "Motor Cab", "Omni Bus", "Tractor", "Three Wheeler"]
+
+
+def vehicle_number(rng):
+    letters = "".join(rng.choices(string.ascii_uppercase, k=2))
+    return f"MH{rng.randint(1, 50):02d}{letters}{rng.randint(0, 9999):04d}"
+
+
+def chassis_number(rng):
+    return "".join(rng.choices(string.ascii_uppercase + string.digits, k=17))
+
+
+def otp_email_body(amount, otp):
+    return (
+        f"Dear Customer, your One Time Password for the payment of Rs {amount:,.2f} "
+        f"to Transport Department is {otp}. Do not share it with anyone."
+    )
+
+
+def transaction_row(rng, when, gmail_id):
+    """One Transaction_Log row (same column order as transaction_journal.HEADERS)."""
+    rto_amount = rng.randint(200, 50000)
+    otp = f"{rng.randint(0, 999999):06d}"
+    return [
+        when.strftime("%Y-%m-%d %H:%M:%S"),
+        vehicle_number(rng),
+        chassis_number(rng),
+        rng.choice(OWNERS),
+        rng.choice(PAYMENT_TYPES),
+        rto_amount,
+        rto_amount + rng.choice([0, 10, 20]),
+        otp,
+        rng.choice(EMPLOYEES),
+        gmail_id,
+        otp_email_body(rto_amount, otp),
+    ]
+
+
+def transaction_rows(count, seed=0, days=30, end=None):
+    """`count` rows spread evenly over the `days` days before `end` (default: now), oldest first."""
+    rng = random.Random(seed)
+    end = end or datetime.now()
+    step = timedelta(days=days) / max(count, 1)
+    start = end - timedelta(days=days)
+    for i in range(count):
+        yield transaction_row(rng, start + step * i, f"synthetic-{seed}-{i:08d}")
+
+
+def write_transaction_workbook(path, count, seed=0, days=30):
+    """Master workbook with a Transaction_Log tab of `count` rows (streamed, so 1M rows is fine)."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=JOURNAL_TAB)
+    ws.append(HEADERS)
+    for row in transaction_rows(count, seed=seed, days=days):
+        ws.append(row)
+    types = wb.create_sheet(title="Transaction_Types")
+    types.append(["Type"])
+    for payment_type in PAYMENT_TYPES:
+        types.append([payment_type])
+    wb.save(path)
+
+
+def gmail_message(msg_id, amount, otp, when):
+    """A messages().get(format='full') response carrying an OTP email."""
+    body = base64.urlsafe_b64encode(otp_email_body(amount, otp).encode("utf-8")).decode("ascii")
+    return {
+        "id": msg_id,
+        "payload": {
+            "headers": [
+                {"name": "Subject", "value": "OTP for Transport Department payment"},
+                {"name": "Date", "value": when.strftime("%a, %d %b %Y %H:%M:%S +0530")},
+            ],
+            "parts": [
+                {"mimeType": "text/plain", "body": {"data": body}},
+                {"mimeType": "text/html", "body": {"data": body}},
+            ],
+        },
+    }
+
+
+def gmail_messages(count, seed=0):
+    """{message id: payload} for `count` OTP emails, newest first."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    messages = {}
+    for i in range(count):
+        msg_id = f"{rng.getrandbits(64):016x}"
+        amount = rng.randint(200, 50000) + rng.choice([0, 0.5])
+        messages[msg_id] = gmail_message(msg_id, amount, f"{rng.randint(0, 999999):06d}", now - timedelta(minutes=i))
+    return messages
+
+
+# Receipt texts as they look after read_rto_receipts.normalize_text, one template per schema
+RECEIPT_TEMPLATES = {
+    "MV Tax Receipt": """MV Tax Payment Receipt
+Receipt No: MH12V{serial} MH12C{serial}
+GRN No: {grn}
+Transaction Identification Number {tin}
+Tax Period 01-{month}-2025 to 30-{month}-2025
+Vehicle No: {vehicle}
+Chasis No: {chassis}
+Vehicle Class: {vehicle_class}
+Transaction Date: {day:02d}-{month}-2025 10:15 AM
+Bank Reference Number: {bank_ref}
+GRAND TOTAL (in Rs): {amount}""",
+
+    "National Permit Receipt": """National Permit Composite Fee Payment Detail
+Regn. No.: {vehicle}
+Chassis No.: {chassis}
+NP Auth No: NP/{serial}/2025
+Vehicle Class: {vehicle_class} Owner Name: {owner}
+Authorization Details:
+{day:02d}-08-2025 {day:02d}-08-2026 {amount}
+Transaction Id: {tin}
+Transaction Date: {day:02d}-08-2025 10:15:00
+Bank Ref No: {bank_ref}
+Penalty
+0""",
+
+    "Permit Renewal Receipt": """Renewal of Permit Authorization
+Receipt No: MH12P{serial}
+Vehicle No: {vehicle}
+Chassis No: {chassis}
+Vehicle Class: {vehicle_class} Owner Name: {owner}
+Description: Renewal of goods carrier permit
+Total {amount}.00
+Penalty 0.00
+Tax Paid Upto: 31-Mar-2026
+Receipt Date: {day:02d}-{month}-2025
+GRAND TOTAL (in Rs): {amount}""",
+
+    "New Registration Receipt": """E-FEE RECEIPT
+Fitness Inspection
+Receipt No: MH12D{serial}
+Vehicle Registration Date: {day:02d}-08-2025
+Vehicle No: {vehicle}
+Vehicle Class: {vehicle_class} Owner Name: {owner}
+Chassis No:
+{chassis}
+Bank Reference Number: {bank_ref}
+GRAND TOTAL (in Rs): {amount}
+Printed On: {day:02d}-{month}-2025 10:15:00""",
+}
+
+RECEIPT_FILE_MARKERS = {
+    "MV Tax Receipt": "MV TAX",
+    "National Permit Receipt": "NP",
+    "Permit Renewal Receipt": "PERMIT RENEWAL",
+    "New Registration Receipt": "NEW REGISTRATION",
+}
+
+
+def receipt_text(schema_name, rng):
+    return RECEIPT_TEMPLATES[schema_name].format(
+        serial=rng.randint(10**9, 10**10 - 1),
+        grn=rng.randint(10**11, 10**12 - 1),
+        tin=rng.randint(10**11, 10**12 - 1),
+        month="Aug",
+        day=rng.randint(1, 28),
+        vehicle=vehicle_number(rng),
+        chassis=chassis_number(rng),
+        vehicle_class=rng.choice(VEHICLE_CLASSES),
+        owner=rng.choice(OWNERS),
+        bank_ref=rng.randint(10**9, 10**10 - 1),
+        amount=rng.randint(200, 50000),
+    )
+
+
+def receipt_texts(count_per_schema, seed=0):
+    """[(file name, text)] with `count_per_schema` receipts of every schema, interleaved."""
+    rng = random.Random(seed)
+    texts = []
+    for i in range(count_per_schema):
+        for schema_name, marker in RECEIPT_FILE_MARKERS.items():
+            texts.append((f"{marker} {i:06d}.pdf", receipt_text(schema_name, rng)))
+    return texts
+
+
+def reconciliation_frames(count, seed=0, matched_share=0.8, shifted_share=0.1):
+    """
+    (otp_df, summary_df) as rto_reconciliation.load_data reads them, before date normalization.
+    About `matched_share` of OTP rows have a receipt; `shifted_share` of those are stamped a day
+    later on the portal (only matched with a day window).
+    """
+    import pandas as pd
+
+    rng = random.Random(seed)
+    otp_rows, receipts = [], []
+    for row in transaction_rows(count, seed=seed):
+        otp_rows.append(dict(zip(HEADERS, row)))
+        roll = rng.random()
+        if roll >= matched_share:
+            continue
+        when = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
+        if roll < matched_share * shifted_share:
+            when += timedelta(days=1)
+        receipts.append({
+            "Vehicle No": row[1],
+            "Chassis No": row[2] if rng.random() < 0.5 else chassis_number(rng),
+            "Transaction Date": when.strftime("%d-%m-%Y %H:%M:%S"),
+            "Amount": row[5],
+            "Bank Ref No": str(rng.randint(10**9, 10**10 - 1)),
+            "Vehicle Class": rng.choice(VEHICLE_CLASSES),
+            "NP Auth No": "NOT FOUND",
+            "Receipt No": f"MH12V{rng.randint(10**9, 10**10 - 1)}",
+        })
+    rng.shuffle(receipts)
+    return pd.DataFrame(otp_rows), pd.DataFrame(receipts)
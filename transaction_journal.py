@@ -0,0 +1,451 @@
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from logger import setup_logger
+from workbook_cache import edit_workbook, read_tab, replace_sheet, sheet_names
+
+logger = setup_logger(name="transaction_journal")
+
+JOURNAL_PATH = Path("transaction_journal.db")
+JOURNAL_TAB = "Transaction_Log"
+EXPORT_BATCH_SIZE = 25  # Re-export the xlsx tab after this many unexported rows
+
+# ─────────────────────────────────────────────
+# Row identity and the Google Sheets round trip
+# ─────────────────────────────────────────────
+# Every row has a stable key, exported as the last column ("Entry ID") of the Transaction_Log tab
+# in the workbook and in Google Sheets. A new row is keyed on its Gmail message ID, or on its
+# normalized contents when it has none (history from before the journal, OTPs keyed in by hand).
+# Once a row carries an Entry ID, that ID is its key, however the other cells are edited or
+# re-rendered.
+#
+# Pulling the tab from Sheets (merge_sheet_rows) treats Sheets as the authority for every row that
+# has been in the sheet (`in_sheet`):
+#   - a row whose Entry ID matches a local row replaces it (edits made in Sheets win);
+#   - a row that was in the sheet and is gone now was deleted there, and is deleted locally;
+#   - rows logged here since the last push are kept, and go up with the next push;
+#   - rows added in Sheets without an Entry ID are inserted and get one on the next push.
+# The journal tab is pushed with valueInputOption RAW, so OTPs keep their leading zeros and dates
+# stay text, and pulled unformatted. Dates, amounts and OTPs are still normalized before keying so
+# rows pushed by older versions (which Sheets re-rendered) still match.
+
+HEADERS = [
+    "Transaction Date", "Vehicle Reg. Number", "Chassis Number", "Owner Name", "Payment Type",
+    "RTO Amount", "Bank Amount", "OTP", "Employee Name",
+    "Gmail Message ID", "Raw Email Body", "Entry ID"
+]
+
+# SQL column for each header but the Entry ID (row_key), in the same order
+COLUMNS = [
+    "transaction_date", "vehicle_reg", "chassis_number", "owner_name", "payment_type",
+    "rto_amount", "bank_amount", "otp", "employee_name",
+    "gmail_id", "raw_body"
+]
+ENTRY_ID = len(COLUMNS)  # Position of the Entry ID in exported rows
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Layouts Sheets and Excel have rendered transaction dates in
+DATE_FORMATS = (
+    DATE_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%d", "%d %b %Y, %H:%M:%S", "%d %b %Y, %H:%M",
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%m/%d/%Y %H:%M:%S", "%d-%m-%Y %H:%M:%S"
+)
+SHEETS_EPOCH = datetime(1899, 12, 30)  # Day 0 of Sheets/Excel serial dates
+KEY_VERSION = "2"
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    row_key TEXT NOT NULL UNIQUE,
+    {", ".join(COLUMNS)},
+    in_sheet INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (transaction_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_gmail ON transactions (gmail_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_lock = threading.RLock()
+_connections = {}
+
+
+class DuplicateEntryError(Exception):
+    """A different row is already logged under the same key (e.g. a second transaction for one OTP email)."""
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def canonical_date(value):
+    """A transaction date as 'YYYY-MM-DD HH:MM:SS' if it can be read, else its text."""
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (SHEETS_EPOCH + timedelta(seconds=round(value * 86400))).strftime(DATE_FORMAT)
+    text = _text(value)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime(DATE_FORMAT)
+        except ValueError:
+            continue
+    return text
+
+
+def _canonical_amount(value):
+    try:
+        return f"{float(str(value).replace(',', '')):.2f}"
+    except (TypeError, ValueError):
+        return _text(value)
+
+
+def _canonical_otp(value):
+    # OTPs are six digits; one that went through a number cell lost its leading zeros
+    text = _text(value)
+    return text.zfill(6) if text.isdigit() else text
+
+
+def _normalize_row(row):
+    row = list(row)[:len(COLUMNS)]
+    return row + [None] * (len(COLUMNS) - len(row))
+
+
+def _clean_row(row):
+    # Storage form of an incoming row: dates and OTPs in the form the app writes them
+    row = _normalize_row(row)
+    if row[0] not in (None, ""):
+        row[0] = canonical_date(row[0])
+    if row[7] not in (None, ""):
+        row[7] = _canonical_otp(row[7])
+    return row
+
+
+def _canonical_row(row):
+    row = _normalize_row(row)
+    canonical = [_text(v) for v in row]
+    canonical[0] = canonical_date(row[0])
+    canonical[5] = _canonical_amount(row[5])
+    canonical[6] = _canonical_amount(row[6])
+    canonical[7] = _canonical_otp(row[7])
+    return canonical
+
+
+def _row_key(row):
+    """Stable identity of a row: its Entry ID if it has one, else derived as described above."""
+    if len(row) > ENTRY_ID and _text(row[ENTRY_ID]):
+        return _text(row[ENTRY_ID])
+    canonical = _canonical_row(row)
+    identity = ["gmail", canonical[9]] if canonical[9] else canonical
+    return hashlib.sha1("\x1f".join(identity).encode("utf-8")).hexdigest()
+
+
+def get_connection(path=JOURNAL_PATH):
+    """Return the shared WAL-mode connection for `path`, creating the schema on first use."""
+    path = str(path)
+    with _lock:
+        conn = _connections.get(path)
+        if conn is None:
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            _migrate(conn)
+            _connections[path] = conn
+        return conn
+
+
+def _migrate(conn):
+    # Caller must hold _lock. Journals created before rows had Entry IDs
+    columns = {info[1] for info in conn.execute("PRAGMA table_info(transactions)")}
+    if "in_sheet" not in columns:
+        conn.execute("ALTER TABLE transactions ADD COLUMN in_sheet INTEGER NOT NULL DEFAULT 0")
+    if _get_meta(conn, "key_version") == KEY_VERSION:
+        return
+
+    # Re-key every row with the current rule. Rows that collapse onto one key are copies the old
+    # rule let back in from Google Sheets; the first one is kept.
+    rows = conn.execute(f"SELECT seq, {', '.join(COLUMNS)} FROM transactions ORDER BY seq").fetchall()
+    keys, copies = {}, []
+    for seq, *values in rows:
+        key = _row_key(values)
+        if key in keys:
+            copies.append((seq,))
+        else:
+            keys[key] = seq
+    conn.execute("BEGIN")
+    try:
+        conn.execute("UPDATE transactions SET row_key = 'rekey:' || seq")
+        conn.executemany("DELETE FROM transactions WHERE seq = ?", copies)
+        conn.executemany("UPDATE transactions SET row_key = ? WHERE seq = ?", list(keys.items()))
+        _set_meta(conn, "key_version", KEY_VERSION)
+        if copies:
+            _bump_revision(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if copies:
+        logger.info(f"🧹 Removed {len(copies)} duplicated journal rows while re-keying")
+
+
+def _get_meta(conn, key, default=None):
+    found = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return found[0] if found else default
+
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def _bump_revision(conn):
+    # Rows were changed or deleted in place; readers that track only seq must reload
+    _set_meta(conn, "revision", int(_get_meta(conn, "revision", 0)) + 1)
+
+
+def revision(path=JOURNAL_PATH):
+    """Counter bumped whenever existing rows are edited or deleted (appends only move last_seq)."""
+    with _lock:
+        return int(_get_meta(get_connection(path), "revision", 0))
+
+
+def append_row(row, path=JOURNAL_PATH):
+    """
+    Insert one transaction row (in HEADERS order). Returns its sequence number, or None if this same
+    row is already present. Raises DuplicateEntryError if a different row already has its key.
+    """
+    row = _normalize_row(row)
+    key = _row_key(row)
+    with _lock:
+        conn = get_connection(path)
+        cur = conn.execute(
+            f"INSERT OR IGNORE INTO transactions (row_key, {', '.join(COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' for _ in COLUMNS)})",
+            [key] + row
+        )
+        if cur.rowcount:
+            return cur.lastrowid
+        existing = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM transactions WHERE row_key = ?", (key,)).fetchone()
+
+    if existing is not None and _canonical_row(existing) == _canonical_row(row):
+        return None
+    raise DuplicateEntryError(f"A different entry is already logged under key {key} (Gmail message {row[9] or '-'})")
+
+
+def import_rows(rows, path=JOURNAL_PATH):
+    """Merge rows from the workbook or Google Sheets; rows already in the journal are skipped."""
+    prepared = []
+    for row in rows:
+        if any(v not in (None, "") for v in row):
+            prepared.append([_row_key(row)] + _clean_row(row))
+
+    with _lock:
+        conn = get_connection(path)
+        before = last_seq(path)
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO transactions (row_key, {', '.join(COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' for _ in COLUMNS)})",
+                prepared
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        added = last_seq(path) - before
+
+    if added:
+        logger.info(f"📥 Imported {added} new rows into the transaction journal")
+    return added
+
+
+def merge_sheet_rows(rows, path=JOURNAL_PATH):
+    """
+    Apply the Transaction_Log tab as pulled from Google Sheets (data rows, HEADERS order), following
+    the rule at the top of this module. Returns (added, updated, deleted).
+    """
+    incoming = {}
+    for row in rows:
+        if any(v not in (None, "") for v in row):
+            incoming[_row_key(row)] = _clean_row(row)
+
+    with _lock:
+        conn = get_connection(path)
+        stored = {
+            key: (in_sheet, values)
+            for key, in_sheet, *values in conn.execute(f"SELECT row_key, in_sheet, {', '.join(COLUMNS)} FROM transactions")
+        }
+        inserts, updates, confirmed = [], [], []
+        for key, values in incoming.items():
+            found = stored.get(key)
+            if found is None:
+                inserts.append([key] + values)
+            elif _canonical_row(found[1]) != _canonical_row(values):
+                updates.append(values + [key])
+            elif not found[0]:
+                confirmed.append((key,))
+        deletes = [(key,) for key, (in_sheet, _) in stored.items() if in_sheet and key not in incoming]
+
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                f"INSERT INTO transactions (row_key, {', '.join(COLUMNS)}, in_sheet) "
+                f"VALUES (?, {', '.join('?' for _ in COLUMNS)}, 1)",
+                inserts
+            )
+            conn.executemany(
+                f"UPDATE transactions SET {', '.join(f'{col} = ?' for col in COLUMNS)}, in_sheet = 1 WHERE row_key = ?",
+                updates
+            )
+            conn.executemany("UPDATE transactions SET in_sheet = 1 WHERE row_key = ?", confirmed)
+            conn.executemany("DELETE FROM transactions WHERE row_key = ?", deletes)
+            if updates or deletes:
+                _bump_revision(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    if inserts or updates or deletes:
+        logger.info(
+            f"📥 Merged Google Sheets into the transaction journal: {len(inserts)} added, "
+            f"{len(updates)} edited, {len(deletes)} deleted"
+        )
+    return len(inserts), len(updates), len(deletes)
+
+
+def mark_in_sheet(up_to_seq, path=JOURNAL_PATH):
+    """Record that rows up to `up_to_seq` are now in the Google Sheets tab (after a successful push)."""
+    with _lock:
+        get_connection(path).execute("UPDATE transactions SET in_sheet = 1 WHERE seq <= ? AND in_sheet = 0", (up_to_seq,))
+
+
+def last_seq(path=JOURNAL_PATH):
+    """Highest sequence number written so far (0 for an empty journal)."""
+    with _lock:
+        found = get_connection(path).execute("SELECT MAX(seq) FROM transactions").fetchone()
+    return found[0] or 0
+
+
+def iter_rows(since_date=None, path=JOURNAL_PATH):
+    """Yield journal rows in HEADERS order, oldest first, optionally only from `since_date` (text compare)."""
+    query = f"SELECT {', '.join(COLUMNS)}, row_key FROM transactions"
+    params = ()
+    if since_date:
+        query += " WHERE transaction_date >= ?"
+        params = (since_date,)
+    query += " ORDER BY seq"
+
+    with _lock:
+        rows = get_connection(path).execute(query, params).fetchall()
+    for row in rows:
+        yield list(row)
+
+
+def row_count(path=JOURNAL_PATH):
+    with _lock:
+        return get_connection(path).execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+
+def stream_rows(up_to_seq=None, batch_size=1000, path=JOURNAL_PATH):
+    """
+    Yield journal rows oldest first without holding them all in memory. Uses its own read-only
+    connection (WAL lets it read alongside writers), so the shared connection is never blocked.
+    `up_to_seq` pins the stream to a fixed snapshot of the journal.
+    """
+    get_connection(path)  # Make sure the schema exists
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        query = f"SELECT {', '.join(COLUMNS)}, row_key FROM transactions"
+        params = ()
+        if up_to_seq is not None:
+            query += " WHERE seq <= ?"
+            params = (up_to_seq,)
+        cur = conn.execute(query + " ORDER BY seq", params)
+        while True:
+            batch = cur.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                yield list(row)
+    finally:
+        conn.close()
+
+
+def logged_gmail_ids(path=JOURNAL_PATH):
+    """Gmail message IDs whose OTP has already been logged against a transaction."""
+    with _lock:
+        rows = get_connection(path).execute(
+            "SELECT DISTINCT gmail_id FROM transactions WHERE gmail_id IS NOT NULL AND gmail_id != ''"
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def is_logged(gmail_id, path=JOURNAL_PATH):
+    """True if the OTP from this Gmail message is in the journal (logged here or merged from Sheets)."""
+    with _lock:
+        found = get_connection(path).execute("SELECT 1 FROM transactions WHERE gmail_id = ? LIMIT 1", (gmail_id,)).fetchone()
+    return found is not None
+
+
+def bootstrap_from_excel(excel_path, path=JOURNAL_PATH):
+    """Seed an empty journal from the existing Transaction_Log tab so history is not lost."""
+    with _lock:
+        if _get_meta(get_connection(path), "bootstrapped") or last_seq(path):
+            return 0
+    names = sheet_names(excel_path)
+    if not names:
+        return 0
+
+    rows = read_tab(excel_path, JOURNAL_TAB if JOURNAL_TAB in names else names[0], min_row=2)
+
+    added = import_rows(rows, path)
+    with _lock:
+        conn = get_connection(path)
+        _set_meta(conn, "exported_seq", last_seq(path))
+        _set_meta(conn, "bootstrapped", 1)
+    logger.info(f"✅ Seeded transaction journal with {added} rows from '{excel_path}'")
+    return added
+
+
+def pending_export_count(path=JOURNAL_PATH):
+    with _lock:
+        exported = int(_get_meta(get_connection(path), "exported_seq", 0))
+    return last_seq(path) - exported
+
+
+def fill_journal_tab(wb, path=JOURNAL_PATH):
+    """Write the whole journal into the workbook's Transaction_Log tab. Returns the exported seq."""
+    with _lock:
+        seq = last_seq(path)
+        rows = list(iter_rows(path=path))
+
+    ws = replace_sheet(wb, JOURNAL_TAB)
+    ws.append(HEADERS)
+    for row in rows:
+        ws.append(row)
+    logger.info(f"📤 Wrote {len(rows)} journal rows to [{JOURNAL_TAB}]")
+    return seq
+
+
+def mark_exported(seq, path=JOURNAL_PATH):
+    with _lock:
+        _set_meta(get_connection(path), "exported_seq", seq)
+
+
+def export_to_excel(excel_path, path=JOURNAL_PATH):
+    """Regenerate the Transaction_Log tab of the workbook from the journal, leaving other tabs untouched."""
+    with edit_workbook(excel_path) as wb:
+        seq = fill_journal_tab(wb, path)
+        wb.active = wb.sheetnames.index(JOURNAL_TAB)
+    mark_exported(seq, path)
+
+    logger.info(f"✅ Exported transaction journal to '{excel_path}'")
@@ -1,16 +1,14 @@
 import tkinter as tk
 import re
-from gmail_parser import fetch_latest_otps
 from config_loader import load_config, load_transaction_types
 from logger import setup_logger
-from excel_logger import log_otp_to_excel
 from datetime import datetime
-from duplication_check import is_recent_duplicate_transaction
-from sync_to_google import push_to_google_sheet
-from downsync_from_google import refresh_transaction_types, pull_from_google_sheet
 from pathlib import Path
 import threading
 
+# Only Tk and the config are loaded up front so the window can be drawn right away; the OTP flow and
+# the Sheets sync (Google clients, openpyxl) are imported on first use.
+
 # Setup
 config = load_config()
 logger = setup_logger("otp_ui")
@@ -23,40 +21,6 @@ payment_var = None
 dropdown = None
 otp_label = None
 
-# OTP matching logic
-def match_amount(email_amount, expected_amount, tolerance):
-    try:
-        logger.info(f"Comparing email amount {email_amount} with bank amount {expected_amount} (tolerance {tolerance})")
-        return abs(email_amount - float(expected_amount)) <= tolerance
-    except Exception as e:
-        logger.warning(f"Amount matching failed: {e}")
-        return False
-
-def get_latest_valid_otp(vehicle_reg, chassis_number, owner_name, payment_type, rto_amount, bank_amount, employee_name):
-    try:
-        otp_entries = fetch_latest_otps()
-        for entry in otp_entries:
-            if match_amount(entry["amount"], bank_amount, config["amount_tolerance"]):
-                logger.info(f"OTP matched for {vehicle_reg} by {employee_name}: {entry['otp']}")
-                return {
-                    "otp": entry["otp"],
-                    "timestamp": entry["timestamp"],
-                    "vehicle_reg": vehicle_reg,
-                    "chassis_number": chassis_number,
-                    "owner_name": owner_name,
-                    "payment_type": payment_type,
-                    "rto_amount": rto_amount,
-                    "bank_amount": bank_amount,
-                    "employee_name": employee_name,
-                    "gmail_id": entry["gmail_id"],
-                    "raw": entry["raw"]
-                }
-        logger.warning(f"No matching OTP found for {vehicle_reg}")
-        return None
-    except Exception as e:
-        logger.error(f"OTP fetch failed: {e}")
-        return None
-
 # Build input fields
 def build_input_fields(root, labels):
     global payment_var, dropdown
@@ -89,60 +53,23 @@ def build_input_fields(root, labels):
 # OTP fetch logic
 def get_otp():
     global otp_label
+    from otp_flow import request_otp
+
+    def show(data, message):
+        otp_label.config(text=message)
 
-    payment_type = fields["Payment Type"].get().strip()
-    if payment_type == "Select Payment Type":
-        otp_label.config(text="❌ Please select a valid payment type.")
-        logger.warning("Payment type not selected.")
-        return
-
-    vehicle_number = fields["Vehicle Reg. Number"].get().strip()
-    chassis_number = fields["Chassis Number"].get().strip()    
-    rto_amount = fields["Transaction Amount - RTO Portal"].get().strip()
-    bank_amount = fields["Transaction Amount including Bank Charges"].get().strip()
-
-    if not vehicle_number and not chassis_number:
-        otp_label.config(text="❌ Please enter either Vehicle Number or Chassis Number.")
-        logger.warning("Both Vehicle Number and Chassis Number are empty.")
-        return
-
-    excel_path = config["transaction_log_excel_path"]
-    if is_recent_duplicate_transaction(
-        excel_path,
-        vehicle_number,
-        chassis_number,
-        payment_type,
-        rto_amount,
-        bank_amount
-    ):
-        otp_label.config(text="⚠️ Duplicate transaction detected.\nPlease check Vehicle Number / Payment Type.")
-        logger.warning(f"Duplicate transaction detected for Vehicle: {vehicle_number} or Chassis: {chassis_number}")
-        return
-
-    data = get_latest_valid_otp(
-        vehicle_number,
-        chassis_number,
+    status, message, _ = request_otp(
+        fields["Vehicle Reg. Number"].get().strip(),
+        fields["Chassis Number"].get().strip(),
         fields["Owner Name"].get(),
-        payment_type,
-        rto_amount,
-        bank_amount,
-        fields["Employee Name"].get()
+        fields["Payment Type"].get().strip(),
+        fields["Transaction Amount - RTO Portal"].get().strip(),
+        fields["Transaction Amount including Bank Charges"].get().strip(),
+        fields["Employee Name"].get(),
+        on_otp=show
     )
-
-    if data:
-        otp_label.config(text=f"✅ OTP: {data['otp']}")
-        logger.info(f"OTP displayed for {data['vehicle_reg']}")
-        log_otp_to_excel(data)
-        push_to_google_sheet()
-        logger.info("OTP logged and synced to Google Sheets")
-    else:
-        otp_entries = fetch_latest_otps()
-        if otp_entries:
-            otp_label.config(text="⚠️ No OTP matched: Amount mismatch")
-            logger.warning("OTP(s) found, but none matched the bank amount")
-        else:
-            otp_label.config(text="❌ No OTP found in inbox")
-            logger.warning("No OTP emails found in inbox")
+    if status != "matched":
+        otp_label.config(text=message)
 
 def threaded_get_otp():
     fetch_button.config(state="disabled")
@@ -183,21 +110,31 @@ def rebuild_ui(root):
 
 # Clear form and refresh config
 def clear_form():
-    try:
-        pull_from_google_sheet()
-        refresh_transaction_types(
-            excel_path=MASTER_SHEET_PATH,
-            tab_name="Transaction_Types",
-            json_path=Path("transaction_types.json")
-        )
-        logger.info("✅ Config refreshed from Google Sheets")
-    except Exception as e:
-        logger.warning(f"⚠️ Failed to refresh config: {e}")
+    """Refresh from Google Sheets on a worker thread, then rebuild the form on the Tk thread."""
+    otp_label.config(text="⏳ Refreshing from Google Sheets...")
+    fetch_button.config(state="disabled")
 
-    rebuild_ui(root)
+    def refresh():
+        from downsync_from_google import refresh_transaction_types, pull_from_google_sheet
+
+        try:
+            pull_from_google_sheet()
+            refresh_transaction_types(
+                excel_path=MASTER_SHEET_PATH,
+                tab_name="Transaction_Types",
+                json_path=Path("transaction_types.json")
+            )
+            logger.info("✅ Config refreshed from Google Sheets")
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to refresh config: {e}")
+
+        root.after(0, rebuild_ui, root)
+
+    threading.Thread(target=refresh, daemon=True).start()
 
 # Launch UI
-def launch_ui():
+def launch_ui(on_paint=None):
+    """Show the form and run the Tk loop. `on_paint` is called once the window has been drawn."""
     global root
     root = tk.Tk()
     root.title("Secure OTP Utility")
@@ -205,4 +142,7 @@ def launch_ui():
     root.resizable(False, False)
 
     rebuild_ui(root)
+    if on_paint:
+        root.update()
+        on_paint()
     root.mainloop()
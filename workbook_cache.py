@@ -0,0 +1,153 @@
+import os
+import threading
+from contextlib import contextmanager
+from logger import setup_logger
+
+logger = setup_logger(name="workbook_cache")
+
+# ─────────────────────────────────────────────
+# Process-wide workbook access layer
+# ─────────────────────────────────────────────
+# Parsed copies of each workbook are kept in memory and re-parsed only when the file's
+# (mtime, size) changes. Readers get immutable per-tab snapshots (tuples of row values) taken from
+# a data_only copy, so formula cells read as their last computed values, as they always have.
+# Writers go through edit_workbook(), which edits a copy that keeps the formulas, holds the lock
+# for the whole edit, saves atomically and re-stamps the cache so it does not reload its own save.
+
+_lock = threading.RLock()
+# path -> {"stamp": (mtime, size), "wb": Workbook with formulas (edits) or None,
+#          "values": data_only Workbook (reads) or None, "tabs": {name: tuple of rows}}
+_cache = {}
+
+
+def _stamp(path):
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+
+def _entry(path, kind):
+    # Caller must hold _lock. `kind` is "values" (data_only, for reads) or "wb" (formulas, for edits)
+    from openpyxl import load_workbook
+
+    path = str(path)
+    stamp = _stamp(path)
+    if stamp is None:
+        _cache.pop(path, None)
+        return None
+
+    entry = _cache.get(path)
+    if entry is None or entry["stamp"] != stamp:
+        entry = {"stamp": stamp, "wb": None, "values": None, "tabs": {}}
+        _cache[path] = entry
+    if entry[kind] is None:
+        entry[kind] = load_workbook(path, data_only=(kind == "values"))
+        logger.info(f"📖 Loaded workbook '{path}' into cache")
+    return entry
+
+
+def invalidate(path):
+    with _lock:
+        _cache.pop(str(path), None)
+
+
+def sheet_names(path):
+    """Tab names of the workbook, or [] if the file does not exist."""
+    with _lock:
+        entry = _cache.get(str(path))
+        if entry is None or entry["stamp"] != _stamp(path) or not (entry["wb"] or entry["values"]):
+            entry = _entry(path, "values")
+        if entry is None:
+            return []
+        return list((entry["values"] or entry["wb"]).sheetnames)
+
+
+def read_tab(path, tab_name, min_row=1):
+    """
+    Snapshot of a tab as a tuple of row-value tuples (from `min_row` on), or None if the file or tab
+    is missing. Snapshots are never mutated, so callers may keep them.
+    """
+    with _lock:
+        entry = _entry(path, "values")
+        if entry is None or tab_name not in entry["values"].sheetnames:
+            return None
+        rows = entry["tabs"].get(tab_name)
+        if rows is None:
+            rows = tuple(entry["values"][tab_name].iter_rows(values_only=True))
+            entry["tabs"][tab_name] = rows
+    return rows[min_row - 1:]
+
+
+def tab_row_count(path, tab_name):
+    """
+    Number of rows in a tab (0 if the file or tab is missing). Uses the cached snapshot when there is
+    one, else the dimensions stored in the file, so no cells are parsed just to size a tab.
+    """
+    from openpyxl import load_workbook
+
+    path = str(path)
+    with _lock:
+        entry = _cache.get(path)
+        if entry is not None and entry["stamp"] == _stamp(path) and tab_name in entry["tabs"]:
+            return len(entry["tabs"][tab_name])
+    if _stamp(path) is None:
+        return 0
+
+    wb = load_workbook(path, read_only=True)
+    try:
+        if tab_name not in wb.sheetnames:
+            return 0
+        ws = wb[tab_name]
+        if ws.max_row is None:
+            # No stored dimensions (some writers omit them); stream the rows instead
+            return sum(1 for _ in ws.iter_rows(values_only=True))
+        return ws.max_row
+    finally:
+        wb.close()
+
+
+def replace_sheet(wb, title):
+    """Swap `title` for an empty sheet at the same position (much faster than deleting rows)."""
+    position = len(wb.sheetnames)
+    if title in wb.sheetnames:
+        position = wb.sheetnames.index(title)
+        wb.remove(wb[title])
+    return wb.create_sheet(title=title, index=position)
+
+
+def _save(wb, path):
+    # Write next to the target and swap in, so a crash never leaves a half-written workbook
+    tmp_path = f"{path}.tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def edit_workbook(path):
+    """
+    Serialized read-modify-write of a workbook. Yields the cached Workbook (a new empty one if the
+    file does not exist yet) and saves it when the block exits without raising.
+    """
+    from openpyxl import Workbook
+
+    path = str(path)
+    with _lock:
+        entry = _entry(path, "wb")
+        if entry is None:
+            wb = Workbook()
+            wb.remove(wb.active)
+        else:
+            wb = entry["wb"]
+
+        try:
+            yield wb
+            _save(wb, path)
+        except BaseException:
+            # The in-memory copy may be half-edited; reload from disk next time
+            _cache.pop(path, None)
+            raise
+
+        # Readers reload the data_only copy from the saved file when they next need it
+        _cache[path] = {"stamp": _stamp(path), "wb": wb, "values": None, "tabs": {}}